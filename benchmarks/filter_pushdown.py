@@ -0,0 +1,84 @@
+"""Compare avec EXPLAIN QUERY PLAN et en durée les filtres de SqlUi, en CTE ou poussés
+
+Compare un CTE matérialisé filtré de l'extérieur et le select d'origine filtré par
+read_cte.get_read_source / get_stmt_no_pag_dt, puis mesure les deux requêtes.
+Les index attendus dans le plan de la requête poussée sont vérifiés par tests/test_filter_pushdown.py.
+
+Usage : python -m benchmarks.filter_pushdown [nombre_de_lignes]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, insert, select, text
+
+from database.models import Base, Product, SalesDepartment, Stock, StockRecord
+from utils.crud import read_cte
+
+
+def get_plan(connection, stmt):
+	sql = str(stmt.compile(connection, compile_kwargs={"literal_binds": True}))
+	return [row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+def timed(connection, stmt, repeat=20):
+	start = time.perf_counter()
+	for _ in range(repeat):
+		connection.execute(stmt).all()
+	return (time.perf_counter() - start) / repeat
+
+
+def populate(engine, rows):
+	"""Schéma et données : 100 produits, 100 enregistrements, rows lignes de stock"""
+	Base.metadata.create_all(engine)
+	with engine.begin() as connection:
+		connection.execute(insert(SalesDepartment), [{'name': "Service"}])
+		connection.execute(insert(Product), [{'name': f"Produit {i}", 'quantity': 1, 'unit': "kg"} for i in range(100)])
+		connection.execute(insert(StockRecord), [
+			{'id_sales_department': 1, 'start_date': date(2024, 1, 1) + timedelta(days=i), 'end_date': date(2024, 12, 31)}
+			for i in range(100)
+		])
+		connection.execute(insert(Stock), [
+			{'id_product': i % 100 + 1, 'id_stock_record': i % 100 + 1, 'quantity': i % 50}
+			for i in range(rows)
+		])
+		connection.execute(text("ANALYZE"))
+
+
+def get_statements():
+	"""La même lecture filtrée, hors d'un CTE matérialisé (« CTE ») et poussée dans le select (« pushdown »)"""
+	base = select(
+		Stock.id,
+		Stock.id_product,
+		Stock.quantity.label("qty"),
+		StockRecord.start_date.label("debut"),
+	).join(StockRecord, Stock.id_stock_record == StockRecord.id)
+	no_dt_filters = {'id_product': [3, 7]}
+	dt_filters = {'debut': (date(2024, 1, 1), date(2024, 2, 1))}
+
+	cte = base.cte().prefix_with("MATERIALIZED")
+	source = read_cte.get_read_source(base, base.cte())
+	return {
+		"CTE": read_cte.apply_dt_filters(read_cte.get_stmt_no_pag_dt(cte, no_dt_filters), dt_filters),
+		"pushdown": read_cte.apply_dt_filters(read_cte.get_stmt_no_pag_dt(source, no_dt_filters), dt_filters),
+	}
+
+
+def run(rows):
+	with tempfile.TemporaryDirectory() as directory:
+		engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+		populate(engine, rows)
+		with engine.connect() as connection:
+			for label, stmt in get_statements().items():
+				plan = get_plan(connection, stmt)
+				elapsed = timed(connection, stmt)
+				print(f"{label:>9} : {elapsed * 1000:.2f} ms")
+				for step in plan:
+					print(f"            {step}")
+		engine.dispose()
+
+
+if __name__ == '__main__':
+	run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,39 @@
+"""Compare le débit d'écriture SQLite avec et sans les PRAGMA de modules/db.py
+
+Usage : python -m benchmarks.sqlite_pragmas [nombre_de_lignes]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from database.models import Base, Product
+from modules.db import set_sqlite_pragmas
+
+
+def run(rows, tuned):
+	with tempfile.TemporaryDirectory() as directory:
+		engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+		if tuned:
+			set_sqlite_pragmas(engine)
+		Base.metadata.create_all(engine)
+
+		# Une transaction par ligne, comme Repository.create hors DB.transaction()
+		start = time.perf_counter()
+		with Session(engine) as session:
+			for i in range(rows):
+				session.add(Product(name=f"Produit {i}", quantity=1, unit="kg"))
+				session.commit()
+		elapsed = time.perf_counter() - start
+		engine.dispose()
+	return elapsed
+
+
+if __name__ == '__main__':
+	rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+	for label, tuned in (("défaut", False), ("optimisé", True)):
+		elapsed = run(rows, tuned)
+		print(f"{label:>9} : {rows} lignes en {elapsed:.2f}s ({rows / elapsed:,.0f} lignes/s)")
@@ -0,0 +1,85 @@
+"""Compare le temps d'exécution d'une page SqlUi stylée : pandas Styler contre st.column_config
+
+« styler » et « row_style_fn » affichent les mêmes formats et la même distinction des lignes ;
+« column_config » donne la référence sans style.
+
+Usage : python -m benchmarks.sqlui_render [nombre_de_lignes] [exécutions]
+"""
+import sys
+import time
+
+from streamlit.testing.v1 import AppTest
+
+
+def script(mode: str, rows: int):
+	import enum
+	from datetime import date, timedelta
+
+	import numpy as np
+	import pandas as pd
+	import streamlit as st
+	from sqlalchemy import Column, Date, Enum, Integer, MetaData, Numeric, Table, select
+
+	from utils.crud.sql_iu import SqlUi
+
+	class Unit(enum.Enum):
+		kg = "Kilogramme"
+		l = "Litre"
+
+	table = Table(
+		"bench", MetaData(),
+		Column("id", Integer, primary_key=True),
+		Column("unit", Enum(Unit)),
+		Column("amount", Numeric(10, 2)),
+		Column("date", Date),
+	)
+	df = pd.DataFrame({
+		"id": range(rows),
+		"unit": [Unit.kg if i % 3 else Unit.l for i in range(rows)],
+		"amount": [(i % 200 - 100) * 1.5 for i in range(rows)],
+		"date": [date(2024, 1, 1) + timedelta(days=i % 365) for i in range(rows)],
+	})
+	formatter = {"amount": "{:,.2f}", "date": "{:%d/%m/%Y}"}
+
+	if mode == "styler":
+		# Rendu d'origine : conversion des enum valeur par valeur, style appliqué ligne par ligne
+		df["unit"] = df["unit"].map(lambda v: v if isinstance(v, str) else v.value)
+
+		def style_fn(row):
+			bg = "background-color: rgba(0, 255, 0, 0.1)" if row.amount > 0 else "background-color: rgba(255, 0, 0, 0.2)"
+			return [bg] * len(row)
+
+		st.dataframe(df.style.format(formatter).apply(style_fn, axis=1), hide_index=True, height=650)
+		return
+
+	ui = SqlUi.__new__(SqlUi)
+	ui.cte = select(table).cte()
+	ui.df_style_formatter = formatter
+	ui.rolling_total_column = None
+	ui.style_fn = None
+	ui.row_style_fn = None
+	if mode == "row_style_fn":
+		ui.row_style_fn = lambda frame: np.where(frame["amount"] > 0, "🟢", "🔴")
+	ui.hide_id = True
+	ui.read_use_container_width = False
+	ui.base_key = "bench"
+	ui.data_container = st.container()
+	ui.show_df(ui.convert_arrow(df))
+
+
+def run(mode: str, rows: int, reruns: int):
+	at = AppTest.from_function(script, kwargs={"mode": mode, "rows": rows}, default_timeout=60)
+	at.run()
+	start = time.perf_counter()
+	for _ in range(reruns):
+		at.run()
+	assert not at.exception, at.exception
+	return (time.perf_counter() - start) / reruns
+
+
+if __name__ == '__main__':
+	rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+	reruns = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+	for mode in ("styler", "row_style_fn", "column_config"):
+		elapsed = run(mode, rows, reruns)
+		print(f"{mode:>13} : {rows} lignes, {elapsed * 1000:.1f} ms par exécution")
@@ -1,8 +1,81 @@
+from sqlalchemy import String, cast, func
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.sql.functions import GenericFunction
+
+
+class format_date(GenericFunction):
+	"""Date au format JJ/MM/AAAA, comme strftime('%d/%m/%Y') dans __str__"""
+	type = String()
+	inherit_cache = True
+
+
+@compiles(format_date)
+def compile_format_date(element, compiler, **kw):
+	return compiler.process(cast(*element.clauses, String), **kw)
+
+
+@compiles(format_date, "sqlite")
+def compile_format_date_sqlite(element, compiler, **kw):
+	return compiler.process(func.strftime("%d/%m/%Y", *element.clauses), **kw)
+
+
+@compiles(format_date, "postgresql")
+def compile_format_date_postgresql(element, compiler, **kw):
+	return compiler.process(func.to_char(*element.clauses, "DD/MM/YYYY"), **kw)
+
+
+@compiles(format_date, "mysql")
+def compile_format_date_mysql(element, compiler, **kw):
+	return compiler.process(func.date_format(*element.clauses, "%d/%m/%Y"), **kw)
+
+
+class format_decimal(GenericFunction):
+	"""Nombre avec l'échelle de sa colonne (25.00), comme str() d'un Decimal Numeric(p, s)"""
+	type = String()
+	inherit_cache = True
+
+
+@compiles(format_decimal)
+def compile_format_decimal(element, compiler, **kw):
+	# Numeric(p, s) garde son échelle une fois converti en texte (PostgreSQL, MySQL)
+	return compiler.process(cast(*element.clauses, String), **kw)
+
+
+@compiles(format_decimal, "sqlite")
+def compile_format_decimal_sqlite(element, compiler, **kw):
+	# SQLite stocke un REAL : l'échelle est rendue par printf
+	(expression,) = element.clauses
+	scale = getattr(expression.type, "scale", None) or 0
+	return compiler.process(func.printf(f"%.{scale}f", expression), **kw)
 
 
 class Base(DeclarativeBase):
 	__crud_tablename__: str = None
+	# Colonnes indexées pour la recherche plein texte (voir database/search.py)
+	__searchable__: tuple[str, ...] = ()
+	# Clés étrangères dont la ligne référencée est cherchée à son tour (Stock : produit, enregistrement)
+	__searchable_through__: tuple[str, ...] = ()
+	# Clés étrangères dont la suppression de la ligne référencée supprime aussi la ligne (voir DeleteRows)
+	__deleted_with__: tuple[str, ...] = ()
+
+	@classmethod
+	def __label__(cls):
+		"""Requête (id, label) : le libellé de __str__ calculé en SQL, jointures comprises
+
+		None si le modèle n'en déclare pas : les libellés passent alors par les objets.
+		"""
+		return None
+
+	@classmethod
+	def __label_search__(cls):
+		"""Expression indexée par laquelle commence le libellé, pour la recherche par préfixe
+
+		Les index sur lower(...) sont créés par la migration add_label_search_indexes.
+
+		None si le modèle n'en déclare pas : la recherche porte alors sur le libellé, sans index.
+		"""
+		return None
 
 	def to_dict(self):
 		return {
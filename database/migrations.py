@@ -0,0 +1,128 @@
+"""Migrations versionnées du schéma de la base de données"""
+
+import threading
+import time
+from datetime import datetime
+
+from loguru import logger
+from sqlalchemy import Column, DateTime, Float, Index, Integer, MetaData, String, Table, func, insert, select
+from sqlalchemy.schema import CreateIndex
+
+from database.models import *
+from database.search import FullTextSearch
+
+schema_version = Table(
+	"schema_version",
+	MetaData(),
+	Column("version", Integer, primary_key=True),
+	Column("name", String(100), nullable=False),
+	Column("applied_at", DateTime, nullable=False),
+	Column("duration_ms", Float, nullable=False),
+)
+
+# Migrations dans l'ordre d'application : la version d'une migration est sa position (1, 2, ...)
+MIGRATIONS = []
+
+
+def migration(func):
+	MIGRATIONS.append(func)
+	return func
+
+
+def lower_index(name: str, tablename: str, colname: str, *colnames: str):
+	"""Index sur lower(colonne), suivie de colnames telles quelles, gardé hors des métadonnées des modèles
+
+	Sous SQLite, checkfirst ne voit pas les index sur expression : déclaré dans un modèle,
+	il serait recréé (et en erreur) par les migrations qui parcourent __table__.indexes.
+	"""
+	table = Table(tablename, MetaData(), *(Column(column, String) for column in (colname, *colnames)))
+	return Index(name, func.lower(table.c[colname]), *(table.c[column] for column in colnames))
+
+
+# Index des __label_search__ des modèles, pour la saisie assistée des clés étrangères
+LABEL_SEARCH_INDEXES = (
+	lower_index('ix_users_first_name_lower', 'users', 'first_name'),
+	lower_index('ix_products_name_lower', 'products', 'name'),
+	lower_index('ix_sales_departments_name_lower', 'sales_departments', 'name'),
+)
+
+
+@migration
+def create_tables(connection):
+	"""Schéma initial"""
+	Base.metadata.create_all(connection)
+
+
+@migration
+def add_performance_indexes(connection):
+	"""Index sur les colonnes de jointure et de recherche"""
+	for model in (Product, StockRecord, Stock):
+		for index in model.__table__.indexes:
+			index.create(connection, checkfirst=True)
+
+
+@migration
+def add_fulltext_search(connection):
+	"""Tables FTS5 des modèles qui déclarent __searchable__ (SQLite seulement, LIKE ailleurs)"""
+	if not FullTextSearch.is_supported(connection):
+		logger.warning("| Migration=add_fulltext_search | FTS5 indisponible, recherche par LIKE")
+		return
+	for mapper in Base.registry.mappers:
+		if mapper.class_.__searchable__:
+			FullTextSearch.create(connection, mapper.class_)
+
+
+@migration
+def add_label_search_indexes(connection):
+	"""Index sur lower(...) des colonnes de __label_search__, pour la saisie assistée des clés étrangères"""
+	for index in LABEL_SEARCH_INDEXES:
+		connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+@migration
+def add_product_lookup_index(connection):
+	"""Index de la recherche d'un produit par nom (sans casse), quantité et unité lors des imports"""
+	index = lower_index('ix_products_name_lower_quantity_unit', 'products', 'name', 'quantity', 'unit')
+	connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+class Migrator:
+	migrations = MIGRATIONS
+	timings = {}
+	_lock = threading.Lock()
+	_done = False
+
+	@classmethod
+	def current_version(cls, connection):
+		return connection.execute(select(schema_version.c.version).order_by(schema_version.c.version.desc())).scalar() or 0
+
+	@classmethod
+	def run(cls, engine):
+		"""Applique les migrations manquantes, une seule fois par processus"""
+		if cls._done:
+			return cls.timings
+		with cls._lock:
+			if cls._done:
+				return cls.timings
+			schema_version.create(engine, checkfirst=True)
+			with engine.connect() as connection:
+				current = cls.current_version(connection)
+
+			for version, func in enumerate(cls.migrations, start=1):
+				if version <= current:
+					continue
+				start = time.perf_counter()
+				with engine.begin() as connection:
+					if connection.dialect.name == "sqlite":
+						# pysqlite n'ouvre pas de transaction avant un DDL : une migration en échec resterait appliquée à moitié
+						connection.exec_driver_sql("BEGIN")
+					func(connection)
+					duration_ms = (time.perf_counter() - start) * 1000
+					connection.execute(insert(schema_version).values(
+						version=version, name=func.__name__, applied_at=datetime.utcnow(), duration_ms=duration_ms
+					))
+				cls.timings[func.__name__] = duration_ms
+				logger.info("| Migration={} | Version={} | Duration={:.1f}ms", func.__name__, version, duration_ms)
+
+			cls._done = True
+		return cls.timings
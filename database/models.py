@@ -3,16 +3,17 @@
 
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, DateTime, JSON, Numeric, Enum, ForeignKey, Date
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Numeric, Enum, ForeignKey, Date, Index, func, select
 from sqlalchemy.orm import relationship
 
-from database.base import Base
+from database.base import Base, format_date, format_decimal
 
 
 class User(Base):
 	"""Modèle utilisateur"""
 	__tablename__ = "users"
 	__crud_tablename__ = "utilisateurs"
+	__searchable__ = ("first_name", "last_name", "email")
 
 	id = Column(Integer, primary_key=True, index=True, info={'label': 'ID'})
 	email = Column(String(100), unique=True, index=True, nullable=False, info={'label': 'E-mail'})
@@ -25,11 +26,23 @@ class User(Base):
 	def __str__(self):
 		return f"{self.first_name} {self.last_name}"
 
+	@classmethod
+	def __label__(cls):
+		return select(cls.id, (cls.first_name + " " + cls.last_name).label("label"))
+
+	@classmethod
+	def __label_search__(cls):
+		return func.lower(cls.first_name)
+
 
 class Product(Base):
 	"""Modèle produit"""
 	__tablename__ = "products"
 	__crud_tablename__ = "produits"
+	__searchable__ = ("name",)
+	__table_args__ = (
+		Index('ix_products_name_quantity_unit', 'name', 'quantity', 'unit'),
+	)
 
 	id = Column(Integer, primary_key=True, index=True, info={'label': 'ID'})
 	name = Column(String(100), nullable=False, info={'label': 'Nom'})
@@ -39,12 +52,26 @@ class Product(Base):
 	created_at = Column(DateTime, default=datetime.utcnow, info={'label': "Date d'enregistrement"})
 
 	def __str__(self):
-		return f"{self.name} ({self.quantity} {self.unit})"
+		unit = f" {self.unit}" if self.unit is not None else ""
+		return f"{self.name} ({self.quantity:.2f}{unit})"
+
+	@classmethod
+	def label_expression(cls):
+		return cls.name + " (" + format_decimal(cls.quantity) + func.coalesce(" " + cls.unit, "") + ")"
+
+	@classmethod
+	def __label__(cls):
+		return select(cls.id, cls.label_expression().label("label"))
+
+	@classmethod
+	def __label_search__(cls):
+		return func.lower(cls.name)
 
 
 class SalesDepartment(Base):
 	__tablename__ = "sales_departments"
 	__crud_tablename__ = "services commerciaux"
+	__searchable__ = ("name",)
 
 	id = Column(Integer, primary_key=True, index=True, info={'label': 'ID'})
 	name = Column(String(100), nullable=False, info={'label': 'Nom'})
@@ -55,10 +82,22 @@ class SalesDepartment(Base):
 	def __str__(self):
 		return f"{self.name}"
 
+	@classmethod
+	def __label__(cls):
+		return select(cls.id, cls.name.label("label"))
+
+	@classmethod
+	def __label_search__(cls):
+		return func.lower(cls.name)
+
 
 class StockRecord(Base):
 	__tablename__ = "stock_records"
 	__crud_tablename__ = "enregistrements de stocks"
+	__searchable_through__ = ("id_sales_department",)
+	__table_args__ = (
+		Index('ix_stock_records_department_dates', 'id_sales_department', 'start_date', 'end_date'),
+	)
 
 	id = Column(Integer, primary_key=True, index=True, info={'label': 'ID'})
 	id_sales_department = Column(ForeignKey("sales_departments.id"), nullable=False, info={'label': 'Service commercial'})
@@ -72,10 +111,33 @@ class StockRecord(Base):
 	def __str__(self):
 		return f"{self.sales_department} ({self.start_date.strftime('%d/%m/%Y')} - {self.end_date.strftime('%d/%m/%Y')})"
 
+	@classmethod
+	def label_expression(cls):
+		return (
+			SalesDepartment.name + " (" + format_date(cls.start_date) + " - " + format_date(cls.end_date) + ")"
+		)
+
+	@classmethod
+	def __label__(cls):
+		return (
+			select(cls.id, cls.label_expression().label("label"))
+			.join(SalesDepartment, cls.id_sales_department == SalesDepartment.id)
+		)
+
+	@classmethod
+	def __label_search__(cls):
+		return SalesDepartment.__label_search__()
+
 
 class Stock(Base):
 	__tablename__ = "stocks"
 	__crud_tablename__ = "stocks"
+	__searchable_through__ = ("id_product", "id_stock_record")
+	__deleted_with__ = ("id_product", "id_stock_record")
+	__table_args__ = (
+		Index('ix_stocks_id_product', 'id_product'),
+		Index('ix_stocks_id_stock_record', 'id_stock_record', 'id_product', 'quantity'),
+	)
 
 	id = Column(Integer, primary_key=True, index=True, info={'label': 'ID'})
 	id_product = Column(ForeignKey("products.id"), nullable=False, info={'label': 'Produit'})
@@ -87,3 +149,17 @@ class Stock(Base):
 
 	def __str__(self):
 		return f"{self.product} ({self.stock_record})"
+
+	@classmethod
+	def __label__(cls):
+		label = Product.label_expression() + " (" + StockRecord.label_expression() + ")"
+		return (
+			select(cls.id, label.label("label"))
+			.join(Product, cls.id_product == Product.id)
+			.join(StockRecord, cls.id_stock_record == StockRecord.id)
+			.join(SalesDepartment, StockRecord.id_sales_department == SalesDepartment.id)
+		)
+
+	@classmethod
+	def __label_search__(cls):
+		return Product.__label_search__()
@@ -1,13 +1,61 @@
+from contextlib import nullcontext
+from numbers import Integral
+
+from sqlalchemy import insert, update, delete, select
+from sqlalchemy.orm import make_transient_to_detached
+
 from modules.auth import Auth
 from modules.db import *
+from utils.cache import Generations, TTLCache
 
 
 class Repository:
 	model = None
+	chunk_size = 500
+	# Cache des lectures find_by_id/find_all (valeurs des colonnes), invalidé par les écritures sur la table
+	cached = False
+	cache_size = 1024
+	cache_ttl = 300
 
 	def __init_subclass__(cls, **kwargs):
 		if cls.model is None:
 			raise ValueError("Model must be defined")
+		cls._cache = TTLCache(cls.cache_size, cls.cache_ttl, cls.__name__ if cls.cached else None)
+
+	@classmethod
+	def _use_cache(cls):
+		return cls.cached and cls.model is not None and DB.current_session() is None
+
+	@classmethod
+	def _cache_key(cls, *parts):
+		return *parts, Generations.get(cls.model.__tablename__)
+
+	@classmethod
+	def _written(cls, model):
+		def invalidate():
+			Generations.bump(model.__tablename__)
+			if model is cls.model:
+				cls._cache.clear()
+
+		DB.on_commit(invalidate)
+
+	@staticmethod
+	def _to_values(row):
+		"""Valeurs des colonnes d'une ligne : le cache ne garde aucun objet ORM, partagé entre sessions"""
+		return None if row is None else row.to_dict()
+
+	@staticmethod
+	def _from_values(model, values):
+		"""Un objet neuf par appel, détaché comme ceux lus dans une session fermée"""
+		if values is None:
+			return None
+		row = model(**values)
+		make_transient_to_detached(row)
+		return row
+
+	@classmethod
+	def cache_stats(cls):
+		return cls._cache.stats()
 
 	@classmethod
 	def _check_params(cls, args, has_data=True):
@@ -46,40 +94,179 @@ class Repository:
 						f"{type(args[0])}"
 					)
 
+	@classmethod
+	def _check_many_params(cls, args, item_type=dict):
+		items = args[0] if cls.model else (args[1] if len(args) == 2 else None)
+		if not cls.model and not isinstance(args[0], type):
+			raise ValueError(
+				"Invalid model type. Expected a class, but received: "
+				f"{type(args[0])}"
+			)
+		if not isinstance(items, (list, tuple)):
+			raise ValueError(
+				"Invalid data type. Expected a list, but received: "
+				f"{type(items)}"
+			)
+		for item in items:
+			if not isinstance(item, item_type):
+				raise ValueError(
+					f"Invalid item type. Expected {item_type.__name__}, but received: "
+					f"{type(item)}"
+				)
+
+	@classmethod
+	def _chunks(cls, items):
+		for i in range(0, len(items), cls.chunk_size):
+			yield items[i:i + cls.chunk_size]
+
 	@staticmethod
 	def _create(session, **kwargs):
 		model = kwargs['model'](**kwargs['data'])
 		session.add(model)
-		session.commit()
+		DB.commit(session)
 		return model.to_dict()
 
 	@classmethod
 	def create(cls, *args, **kwargs):
 		cls._check_params(args)
-		return DB.session_call(
+		model = cls.model if cls.model else args[0]
+		result = DB.session_call(
 			cls._create,
 			{
-				'model': cls.model if cls.model else args[0],
+				'model': model,
 				'data': args[0] if cls.model else args[1]
 			},
 			kwargs.get('catch_exception', False),
 			kwargs.get('show_error', True),
 			kwargs.get('session')
 		)
+		cls._written(model)
+		return result
+
+	@classmethod
+	def _create_many(cls, session, **kwargs):
+		model = kwargs['model']
+		dialect = session.get_bind().dialect
+		ids = []
+		for chunk in cls._chunks(kwargs['data']):
+			if dialect.insert_executemany_returning:
+				stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+				ids.extend(session.execute(stmt, chunk).scalars().all())
+			else:
+				for data in chunk:
+					result = session.execute(insert(model.__table__).values(**data))
+					ids.append(result.inserted_primary_key[0])
+		DB.commit(session)
+		return ids
+
+	@classmethod
+	def create_many(cls, *args, **kwargs):
+		cls._check_many_params(args)
+		model = cls.model if cls.model else args[0]
+		result = DB.session_call(
+			cls._create_many,
+			{
+				'model': model,
+				'data': list(args[0] if cls.model else args[1])
+			},
+			kwargs.get('catch_exception', False),
+			kwargs.get('show_error', True),
+			kwargs.get('session')
+		)
+		cls._written(model)
+		return result
 
 	@classmethod
 	def find_by_id(cls, *args):
-		cls._check_params(args)
+		# Un id, pas de données : seul le modèle passé en argument est vérifié
+		cls._check_params(args if cls.model else args[:1], False)
 		model = cls.model if cls.model else args[0]
 		id = args[0] if cls.model else args[1]
+		if cls._use_cache():
+			values = cls._cache.get_or_set(
+				cls._cache_key('id', id), lambda: cls._to_values(DB.query(model).filter(model.id == id).first())
+			)
+			return cls._from_values(model, values)
 		return DB.query(model).filter(model.id == id).first()
 
+	@classmethod
+	def _find_by_ids(cls, session, **kwargs):
+		model = kwargs['model']
+		rows = []
+		for chunk in cls._chunks(kwargs['ids']):
+			rows.extend(session.execute(select(model).where(model.id.in_(chunk))).scalars().all())
+		return rows
+
+	@classmethod
+	def find_by_ids(cls, *args, **kwargs):
+		model = cls.model if cls.model else args[0]
+		return DB.session_call(
+			cls._find_by_ids,
+			{
+				'model': model,
+				'ids': list(args[0] if cls.model else args[1])
+			},
+			session=kwargs.get('session')
+		)
+
 	@classmethod
 	def find_all(cls, *args):
 		cls._check_params(args, False)
 		model = cls.model if cls.model else args[0]
+		if cls._use_cache():
+			key = cls._cache_key('all')
+			rows = cls._cache.get(key)
+			if rows is None:
+				rows = cls._cache.set(key, tuple(cls._to_values(row) for row in DB.query(model).all()))
+				for values in rows:
+					cls._cache.set(cls._cache_key('id', values['id']), values)
+			return [cls._from_values(model, values) for values in rows]
 		return DB.query(model).all()
 
+	@classmethod
+	def iter_pages(cls, *args, batch_size=1000, where=None, columns=None, after_id=None):
+		"""Parcourt la table par pages de batch_size lignes triées par id, sans OFFSET
+
+		Chaque page est lue entière par sa propre requête « id > dernier id », dans une même session
+		ouverte pendant tout le parcours : les objets d'une page restent attachés et leurs relations
+		chargeables, et aucun curseur ne reste ouvert entre deux pages (sous SQLite, pas d'instantané
+		de lecture tenu pendant le parcours, qui bloquerait les checkpoints du WAL).
+		where accepte une condition ou une liste de conditions, columns une liste de noms ou de
+		colonnes (l'id est toujours inclus).
+		"""
+		model = cls.model if cls.model else args[0]
+		if columns:
+			entities = [getattr(model, col) if isinstance(col, str) else col for col in columns]
+			if not any(getattr(entity, 'key', None) == 'id' for entity in entities):
+				entities.insert(0, model.id)
+		else:
+			entities = [model]
+		if where is None:
+			where = []
+		elif not isinstance(where, (list, tuple)):
+			where = [where]
+
+		session = DB.current_session()
+		with nullcontext(session) if session is not None else DB.connection.session as session:
+			while True:
+				stmt = select(*entities).where(*where).order_by(model.id).limit(batch_size)
+				if after_id is not None:
+					stmt = stmt.where(model.id > after_id)
+				result = session.execute(stmt)
+				page = result.all() if columns else result.scalars().all()
+				if not page:
+					return
+				yield page
+				if len(page) < batch_size:
+					return
+				after_id = page[-1].id
+
+	@classmethod
+	def iter_rows(cls, *args, batch_size=1000, where=None, columns=None, after_id=None):
+		"""Itère ligne à ligne sur iter_pages, en mémoire constante"""
+		for page in cls.iter_pages(*args, batch_size=batch_size, where=where, columns=columns, after_id=after_id):
+			yield from page
+
 	@classmethod
 	def query_dataframe(cls, sql, **kwargs):
 		return DB.query_dataframe(sql, **kwargs)
@@ -87,47 +274,120 @@ class Repository:
 	@staticmethod
 	def _update(session, **kwargs):
 		data = kwargs['data']
-		model = DB.query(kwargs['model']).filter(kwargs['model'].id == data['id']).first()
+		model = session.get(kwargs['model'], data['id'])
 		for key, value in data.items():
 			setattr(model, key, value)
 		session.add(model)
-		session.commit()
+		DB.commit(session)
 		return model.to_dict()
 
 	@classmethod
 	def update(cls, *args, **kwargs):
 		cls._check_params(args)
-		return DB.session_call(
+		model = cls.model if cls.model else args[0]
+		result = DB.session_call(
 			cls._update,
 			{
-				'model': cls.model if cls.model else args[0],
+				'model': model,
 				'data': args[0] if cls.model else args[1]
 			},
 			kwargs.get('catch_exception', False),
 			kwargs.get('show_error', True),
 			kwargs.get('session')
 		)
+		cls._written(model)
+		return result
+
+	@classmethod
+	def _update_many(cls, session, **kwargs):
+		model = kwargs['model']
+		ids = []
+		for chunk in cls._chunks(kwargs['data']):
+			# Seules les lignes existantes sont mises à jour : l'UPDATE par clé primaire échoue sinon
+			matched = set(session.execute(select(model.id).where(model.id.in_([data['id'] for data in chunk]))).scalars())
+			chunk = [data for data in chunk if data['id'] in matched]
+			if chunk:
+				session.execute(update(model), chunk)
+			ids.extend(data['id'] for data in chunk)
+		DB.commit(session)
+		return ids
+
+	@classmethod
+	def update_many(cls, *args, **kwargs):
+		cls._check_many_params(args)
+		data = list(args[0] if cls.model else args[1])
+		if any('id' not in row for row in data):
+			raise ValueError("Invalid data. Every row must contain an 'id' key.")
+		model = cls.model if cls.model else args[0]
+		result = DB.session_call(
+			cls._update_many,
+			{
+				'model': model,
+				'data': data
+			},
+			kwargs.get('catch_exception', False),
+			kwargs.get('show_error', True),
+			kwargs.get('session')
+		)
+		cls._written(model)
+		return result
 
 	@staticmethod
 	def _delete(session, **kwargs):
-		model = DB.query(kwargs['model']).filter(kwargs['model'].id == id).first()
+		model = session.get(kwargs['model'], kwargs['id'])
+		data = model.to_dict()
 		session.delete(model)
-		session.commit()
-		return model.to_dict()
+		DB.commit(session)
+		return data
 
 	@classmethod
 	def delete(cls, *args, **kwargs):
 		cls._check_params(args)
-		return DB.session_call(
+		model = cls.model if cls.model else args[0]
+		result = DB.session_call(
 			cls._delete,
 			{
-				'model': cls.model if cls.model else args[0],
+				'model': model,
 				'id': args[0] if cls.model else args[1]
 			},
 			kwargs.get('catch_exception', False),
 			kwargs.get('show_error', True),
 			kwargs.get('session')
 		)
+		cls._written(model)
+		return result
+
+	@classmethod
+	def _delete_many(cls, session, **kwargs):
+		model = kwargs['model']
+		dialect = session.get_bind().dialect
+		ids = []
+		for chunk in cls._chunks(kwargs['ids']):
+			stmt = delete(model.__table__).where(model.id.in_(chunk))
+			if dialect.delete_returning:
+				ids.extend(session.execute(stmt.returning(model.id)).scalars().all())
+			else:
+				ids.extend(session.execute(select(model.id).where(model.id.in_(chunk))).scalars().all())
+				session.execute(stmt)
+		DB.commit(session)
+		return ids
+
+	@classmethod
+	def delete_many(cls, *args, **kwargs):
+		cls._check_many_params(args, Integral)
+		model = cls.model if cls.model else args[0]
+		result = DB.session_call(
+			cls._delete_many,
+			{
+				'model': model,
+				'ids': list(args[0] if cls.model else args[1])
+			},
+			kwargs.get('catch_exception', False),
+			kwargs.get('show_error', True),
+			kwargs.get('session')
+		)
+		cls._written(model)
+		return result
 
 	@classmethod
 	def query(cls, *args, **kwargs):
@@ -139,24 +399,54 @@ class Repository:
 class UserRepository(Repository):
 	model = User
 
+	# Auth n'est synchronisé qu'à la validation : une transaction annulée n'y laisse rien
+
+	@classmethod
+	def get_users(cls, ids, **kwargs):
+		"""Utilisateurs lus dans la transaction en cours, en dict pour survivre à la validation"""
+		return [user.to_dict() for user in cls.find_by_ids(ids, session=kwargs.get('session'))]
+
 	@classmethod
 	def create(cls, *args, **kwargs):
 		user = super(UserRepository, cls).create(*args, **kwargs)
-		Auth.add_users([user])
+		DB.on_commit(lambda: Auth.add_users([user]))
 		return user
 
 	@classmethod
 	def delete(cls, *args, **kwargs):
 		user = super(UserRepository, cls).delete(*args, **kwargs)
-		Auth.remove_users([user])
+		DB.on_commit(lambda: Auth.remove_users([user]))
 		return user
 
 	@classmethod
 	def update(cls, *args, **kwargs):
 		user = super(UserRepository, cls).update(*args, **kwargs)
-		Auth.update_users([user])
+		DB.on_commit(lambda: Auth.update_users([user]))
 		return user
 
+	@classmethod
+	def create_many(cls, *args, **kwargs):
+		ids = super(UserRepository, cls).create_many(*args, **kwargs)
+		if ids:
+			users = cls.get_users(ids, **kwargs)
+			DB.on_commit(lambda: Auth.add_users(users))
+		return ids
+
+	@classmethod
+	def delete_many(cls, *args, **kwargs):
+		ids = super(UserRepository, cls).delete_many(*args, **kwargs)
+		if ids:
+			DB.on_commit(lambda: Auth.remove_users(ids, by_id=True))
+		return ids
+
+	@classmethod
+	def update_many(cls, *args, **kwargs):
+		ids = super(UserRepository, cls).update_many(*args, **kwargs)
+		if ids:
+			users = cls.get_users(ids, **kwargs)
+			DB.on_commit(lambda: Auth.update_users(users))
+		return ids
+
 
 class StockRepository(Repository):
 	model = Stock
@@ -166,6 +456,8 @@ class StockRecordRepository(Repository):
 
 class ProductRepository(Repository):
 	model = Product
+	cached = True
 
 class SalesDepartmentRepository(Repository):
 	model = SalesDepartment
+	cached = True
@@ -0,0 +1,121 @@
+"""Recherche plein texte : tables FTS5 sous SQLite, LIKE sur les autres bases"""
+import re
+
+from sqlalchemy import Float, Integer, case, column, func, literal_column, or_, select, table, text, union_all
+
+
+class FullTextSearch:
+	"""Recherche sur les colonnes déclarées dans __searchable__ d'un modèle
+
+	Sous SQLite, une table FTS5 à contenu externe ({table}_fts) indexe ces colonnes ; des
+	déclencheurs la tiennent à jour. Sans FTS5, la recherche se rabat sur des LIKE.
+	Un modèle trouve aussi les lignes dont une clé de __searchable_through__ mène à une ligne trouvée.
+	"""
+	_available = {}
+
+	@staticmethod
+	def get_fts_tablename(model):
+		return f"{model.__tablename__}_fts"
+
+	@staticmethod
+	def get_words(search: str):
+		return re.findall(r"\w+", search or "")
+
+	@staticmethod
+	def is_supported(connection):
+		if connection.dialect.name != "sqlite":
+			return False
+		options = connection.exec_driver_sql("PRAGMA compile_options").scalars().all()
+		return "ENABLE_FTS5" in options
+
+	@classmethod
+	def create(cls, connection, model):
+		"""Crée la table FTS5 du modèle et ses déclencheurs, puis l'alimente avec les lignes existantes"""
+		tablename = model.__tablename__
+		fts = cls.get_fts_tablename(model)
+		cols = ", ".join(model.__searchable__)
+		new = ", ".join(f"new.{name}" for name in model.__searchable__)
+		old = ", ".join(f"old.{name}" for name in model.__searchable__)
+		statements = (
+			f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+			f"{cols}, content='{tablename}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+			f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tablename} BEGIN "
+			f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+			f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tablename} BEGIN "
+			f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+			f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {tablename} BEGIN "
+			f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+			f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+			f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+		)
+		for statement in statements:
+			connection.execute(text(statement))
+
+	@classmethod
+	def has_index(cls, bind, model):
+		"""La table FTS5 du modèle existe-t-elle ? (vérifié une fois par base)"""
+		if bind.dialect.name != "sqlite":
+			return False
+		fts = cls.get_fts_tablename(model)
+		key = (str(bind.url), fts)
+		if key not in cls._available:
+			with bind.connect() as connection:
+				cls._available[key] = connection.execute(
+					text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': fts}
+				).first() is not None
+		return cls._available[key]
+
+	@classmethod
+	def get_match_query(cls, search: str):
+		"""Requête MATCH : chaque mot cherché comme préfixe, tous les mots requis"""
+		return " ".join(f'"{word}"*' for word in cls.get_words(search))
+
+	@staticmethod
+	def get_through_model(model, colname: str):
+		"""Modèle référencé par la clé étrangère colname de model"""
+		foreign_key = next(iter(model.__table__.c[colname].foreign_keys))
+		return next(
+			mapper.class_ for mapper in model.registry.mappers
+			if mapper.class_.__table__ is foreign_key.column.table
+		)
+
+	@classmethod
+	def is_searchable(cls, model):
+		return bool(model.__searchable__ or model.__searchable_through__)
+
+	@classmethod
+	def get_ranked(cls, bind, model, search: str):
+		"""Sous-requête (id, rank) des lignes trouvées : le rang le plus faible est le plus pertinent"""
+		words = cls.get_words(search)
+		if not words or not cls.is_searchable(model):
+			return None
+
+		parts = []
+		if model.__searchable__:
+			parts.append(cls.get_own_ranked(bind, model, search, words))
+		for colname in model.__searchable_through__:
+			# Lignes dont la clé mène à une ligne trouvée, au rang de celle-ci (index de la clé)
+			found = cls.get_ranked(bind, cls.get_through_model(model, colname), search)
+			col = model.__table__.c[colname]
+			parts.append(select(model.__table__.c.id, found.c.rank).join(found, col == found.c.id))
+		if len(parts) == 1:
+			return parts[0].subquery()
+		ranked = union_all(*parts).subquery()
+		return select(ranked.c.id, func.min(ranked.c.rank).label("rank")).group_by(ranked.c.id).subquery()
+
+	@classmethod
+	def get_own_ranked(cls, bind, model, search: str, words: list[str]):
+		"""(id, rank) des lignes dont les colonnes __searchable__ contiennent tous les mots"""
+		if cls.has_index(bind, model):
+			fts = cls.get_fts_tablename(model)
+			fts_table = table(fts, column("rowid", Integer), column("rank", Float))
+			return (
+				select(fts_table.c.rowid.label("id"), fts_table.c.rank.label("rank"))
+				.where(literal_column(fts).op("MATCH")(cls.get_match_query(search)))
+			)
+
+		cols = [model.__table__.c[name] for name in model.__searchable__]
+		conditions = [or_(*(col.icontains(word, autoescape=True) for col in cols)) for word in words]
+		# Sans FTS5 : les lignes qui commencent par le premier mot passent devant
+		rank = case((or_(*(col.istartswith(words[0], autoescape=True) for col in cols)), 0), else_=1)
+		return select(model.__table__.c.id, rank.label("rank")).where(*conditions)
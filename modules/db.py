@@ -1,18 +1,313 @@
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
 from datetime import timedelta
-from typing import Any
+from typing import Any, NamedTuple
 
+import pandas as pd
+import pyarrow as pa
 import streamlit as st
+from sqlalchemy import Boolean, Float, create_engine, event, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import Select
 
+from database.migrations import Migrator
 from database.models import *
+from modules.profiler import QueryProfiler
+from utils.cache import Generations
+
+# Réglages appliqués à chaque nouvelle connexion SQLite
+# (surchargeables dans secrets.toml, section [connections.sql.pragmas])
+SQLITE_PRAGMAS = {
+	'journal_mode': 'WAL',
+	'synchronous': 'NORMAL',
+	'mmap_size': 268435456,
+	'cache_size': -65536,
+	'temp_store': 'MEMORY',
+	'busy_timeout': 5000,
+}
+
+# Dimensionnement du pool pour les serveurs MySQL
+# (surchargeable dans secrets.toml, section [connections.sql.pool])
+MYSQL_POOL = {
+	'pool_size': 10,
+	'max_overflow': 20,
+	'pool_recycle': 3600,
+	'pool_pre_ping': True,
+}
+
+
+def get_connection_settings(name="sql"):
+	"""Lit la section [connections.<name>] de secrets.toml"""
+	connections = st.secrets.get('connections', {})
+	if name not in connections:
+		return {}
+	return connections[name].to_dict()
+
+
+def get_backend_name(settings):
+	if 'url' in settings:
+		return make_url(settings['url']).get_backend_name()
+	return settings.get('dialect', '')
+
+
+def get_engine_kwargs(settings):
+	"""Arguments supplémentaires passés à create_engine selon le dialecte"""
+	if get_backend_name(settings) == 'mysql':
+		return {**MYSQL_POOL, **settings.get('pool', {})}
+	return {}
+
+
+def set_sqlite_pragmas(engine, pragmas=None):
+	"""Applique les PRAGMA à chaque connexion ouverte par le moteur"""
+	if engine.dialect.name != 'sqlite' or getattr(engine, '_sqlite_pragmas', None) is not None:
+		return
+	pragmas = {**SQLITE_PRAGMAS, **(pragmas or {})}
+	engine._sqlite_pragmas = pragmas
+
+	@event.listens_for(engine, "connect")
+	def on_connect(dbapi_connection, connection_record):
+		cursor = dbapi_connection.cursor()
+		for name, value in pragmas.items():
+			cursor.execute(f"PRAGMA {name}={value}")
+		cursor.close()
+
+
+def track_writes(engine):
+	"""Incrémente la génération globale à chaque validation sur le moteur"""
+	if getattr(engine, '_tracks_writes', False):
+		return
+	engine._tracks_writes = True
+	event.listen(engine, "commit", lambda connection: Generations.bump())
+
+
+def arrow_dtype(sql_type):
+	"""Type Arrow à largeur fixe correspondant à un type SQLAlchemy, None si inconnu"""
+	if isinstance(sql_type, Numeric) and not isinstance(sql_type, Float):
+		if sql_type.precision is not None:
+			return pd.ArrowDtype(pa.decimal128(sql_type.precision, sql_type.scale or 0))
+		return pd.ArrowDtype(pa.float64())
+	if isinstance(sql_type, Float):
+		return pd.ArrowDtype(pa.float64())
+	if isinstance(sql_type, Boolean):
+		return pd.ArrowDtype(pa.bool_())
+	if isinstance(sql_type, Integer):
+		return pd.ArrowDtype(pa.int64())
+	if isinstance(sql_type, String):
+		return pd.ArrowDtype(pa.string())
+	if isinstance(sql_type, DateTime):
+		return pd.ArrowDtype(pa.timestamp('us'))
+	if isinstance(sql_type, Date):
+		return pd.ArrowDtype(pa.date32())
+	return None
+
+
+def arrow_dtypes(stmt):
+	"""Types Arrow des colonnes d'un select, pour read_sql(dtype=...)"""
+	if not isinstance(stmt, Select):
+		return {}
+	dtypes = {}
+	for col in stmt.selected_columns:
+		dtype = arrow_dtype(col.type)
+		if col.name and dtype is not None:
+			dtypes[col.name] = dtype
+	return dtypes
+
+
+def get_arrow_read(sql, dtype=None):
+	"""Requête à passer à read_sql et types Arrow de ses colonnes (dtype les surcharge)"""
+	if isinstance(sql, Query):
+		sql = sql.statement
+	dtype = {**arrow_dtypes(sql), **(dtype or {})}
+	if isinstance(sql, str):
+		sql = text(sql)
+	return sql, dtype
+
+
+class _Snapshot(NamedTuple):
+	engine: Engine
+	keeper: sqlite3.Connection
+	generation: int
+	created_at: float
+
+
+class ReadReplica:
+	"""Copie en mémoire d'une base SQLite, partagée par tout le processus
+
+	La copie est faite avec l'API de sauvegarde de sqlite3 et refaite dès que la génération
+	d'écriture change ou que le TTL est dépassé. Les écritures restent sur la base principale.
+	"""
+
+	def __init__(self, engine: Engine, ttl: float = 60):
+		self.engine = engine
+		self.ttl = ttl
+		self._lock = threading.Lock()
+		self._snapshot: _Snapshot | None = None
+		self._refreshes = 0
+
+	def _is_fresh(self, snapshot: _Snapshot | None):
+		return (
+				snapshot is not None
+				and snapshot.generation == Generations.get()
+				and time.monotonic() - snapshot.created_at < self.ttl
+		)
+
+	def get_engine(self) -> Engine:
+		snapshot = self._snapshot
+		if not self._is_fresh(snapshot):
+			with self._lock:
+				snapshot = self._snapshot
+				if not self._is_fresh(snapshot):
+					snapshot = self.refresh()
+		return snapshot.engine
+
+	def refresh(self) -> _Snapshot:
+		generation = Generations.get()
+		self._refreshes += 1
+		uri = f"file:replica_{id(self)}_{self._refreshes}?mode=memory&cache=shared"
+
+		# La connexion « keeper » maintient la base en mémoire en vie
+		keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+		source = self.engine.raw_connection()
+		try:
+			source.driver_connection.backup(keeper)
+		finally:
+			source.close()
+
+		def connect():
+			connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+			connection.execute("PRAGMA query_only=1")
+			return connection
+
+		engine = create_engine("sqlite://", creator=connect, poolclass=QueuePool)
+		QueryProfiler.install(engine)
+		# La copie vit tant que son moteur est référencé : un thread qui l'a obtenu avant le
+		# remplacement peut encore s'y connecter. Le keeper est fermé quand le moteur est libéré.
+		weakref.finalize(engine, keeper.close)
+		self._snapshot = _Snapshot(engine, keeper, generation, time.monotonic())
+		return self._snapshot
+
+
+def get_read_replica(engine, settings):
+	replica = settings.get('replica', {})
+	if engine.dialect.name != 'sqlite' or not replica.get('enabled', False):
+		return None
+	return ReadReplica(engine, replica.get('ttl', 60))
+
+
+class bootstrapped:
+	"""Attribut de classe de DB, disponible après DB.bootstrap() qui est lancé au premier accès"""
+
+	def __set_name__(self, owner, name):
+		self.attribute = f"_{name}"
+
+	def __get__(self, instance, owner):
+		if not owner._ready:
+			owner.bootstrap()
+		return getattr(owner, self.attribute)
 
 
 class DB:
-	connection = st.connection("sql")
-	Base.metadata.create_all(connection.engine)
+	settings = bootstrapped()
+	connection = bootstrapped()
+	replica = bootstrapped()
+	_ready = False
+	_bootstrap_lock = threading.Lock()
+	_local = threading.local()
+
+	@classmethod
+	def bootstrap(cls):
+		"""Crée le moteur, applique les migrations et ouvre une première connexion, une fois par processus"""
+		if cls._ready:
+			return
+		with cls._bootstrap_lock:
+			if cls._ready:
+				return
+			settings = get_connection_settings()
+			connection = st.connection("sql", **get_engine_kwargs(settings))
+			set_sqlite_pragmas(connection.engine, settings.get('pragmas'))
+			track_writes(connection.engine)
+			QueryProfiler.install(connection.engine)
+			Migrator.run(connection.engine)
+
+			# Préchauffage : la première connexion du pool est ouverte (et réglée) ici
+			with connection.engine.connect() as c:
+				c.execute(text("SELECT 1"))
+
+			cls._settings = settings
+			cls._connection = connection
+			cls._replica = get_read_replica(connection.engine, settings)
+			cls._ready = True
+
+	@classmethod
+	def read_engine(cls, connection=None) -> Engine:
+		"""Moteur à utiliser pour les lectures : la copie en mémoire si elle est activée"""
+		if cls.replica is not None and (connection is None or connection is cls.connection):
+			return cls.replica.get_engine()
+		return (connection or cls.connection).engine
+
+	@classmethod
+	def read_session(cls, connection=None) -> Session:
+		"""Session destinée aux lectures, liée au moteur de read_engine()"""
+		return Session(cls.read_engine(connection))
+
+	@classmethod
+	def current_session(cls):
+		"""Retourne la session de la transaction en cours sur ce thread, s'il y en a une"""
+		return getattr(cls._local, 'session', None)
+
+	@classmethod
+	@contextmanager
+	def transaction(cls, dry_run=False):
+		"""Ouvre une unité de travail : une seule validation à la sortie, tout est annulé en cas d'erreur
+
+		Avec dry_run, tout est annulé à la sortie (aperçu d'un import). Dans une transaction
+		déjà ouverte, c'est elle qui décide.
+		"""
+		session = cls.current_session()
+		if session is not None:
+			yield session
+			return
+		with cls.connection.session as session:
+			cls._local.session = session
+			try:
+				yield session
+				if dry_run:
+					session.rollback()
+				else:
+					session.commit()
+			except Exception:
+				session.rollback()
+				raise
+			finally:
+				cls._local.session = None
+
+	@classmethod
+	def on_commit(cls, callback):
+		"""Appelle callback après la validation de la transaction en cours, ou tout de suite hors transaction"""
+		session = cls.current_session()
+		if session is None:
+			callback()
+		else:
+			event.listen(session, "after_commit", lambda s: callback(), once=True)
+
+	@classmethod
+	def commit(cls, session):
+		"""Valide la session, ou se contente d'un flush si elle appartient à une transaction en cours"""
+		if session is cls.current_session():
+			session.flush()
+		else:
+			session.commit()
 
 	@classmethod
 	def session_call(cls, callback, params=None, catch_exception=False, show_error=True, session=None):
-		if session:
+		if session is None:
+			session = cls.current_session()
+		if session is not None:
 			return callback(session, **(params if params else {}))
 		else:
 			with cls.connection.session as session:
@@ -29,11 +324,11 @@ class DB:
 
 	@classmethod
 	def execute(cls, sql: str, catch_exception=False, show_error=True, session=None, **kwargs):
-		return cls.session_call(lambda s: s.execute(sql, **kwargs), catch_exception, show_error, session=session)
+		return cls.session_call(lambda s: s.execute(sql, **kwargs), None, catch_exception, show_error, session)
 
 	@classmethod
 	def query(cls, *entities, catch_exception=False, show_error=True, session=None, **kwargs):
-		return cls.session_call(lambda s: s.query(*entities, **kwargs), catch_exception, show_error, session=session)
+		return cls.session_call(lambda s: s.query(*entities, **kwargs), None, catch_exception, show_error, session)
 
 	@classmethod
 	def query_dataframe(
@@ -47,8 +342,68 @@ class DB:
 			params: Any | None = None,
 			**kwargs: Any
 	):
+		if cls.replica is not None and chunksize is None:
+			return cls.query_replica(
+				sql, show_spinner=show_spinner, ttl=ttl, index_col=index_col, params=params, **kwargs
+			)
 		return cls.connection.query(
 			sql,
 			show_spinner=show_spinner, ttl=ttl, index_col=index_col, chunksize=chunksize,
 			params=params, **kwargs
 		)
+
+	@classmethod
+	def query_replica(
+			cls,
+			sql: str,
+			*,
+			show_spinner: bool | str,
+			ttl: float | int | timedelta | None,
+			**kwargs: Any
+	):
+		"""Comme SQLConnection.query, mis en cache de la même façon (ttl, show_spinner), mais lu sur la copie"""
+
+		def _query(sql: str, **kwargs: Any):
+			with cls.read_engine().connect() as connection:
+				return pd.read_sql(text(sql), connection, **kwargs)
+
+		# Un cache par ttl, comme SQLConnection.query, distinct de celui de la base principale
+		_query.__qualname__ = f"{_query.__qualname__}_replica_{str(ttl).replace('.', '_')}"
+		return st.cache_data(show_spinner=show_spinner, ttl=ttl)(_query)(sql, **kwargs)
+
+	@classmethod
+	def iter_dataframe(
+			cls,
+			sql: str | Select | Query,
+			*,
+			chunksize: int = 10000,
+			params: Any | None = None,
+			dtype: dict | None = None,
+	):
+		"""Lit le résultat par morceaux de chunksize lignes, chacun en DataFrame typé Arrow
+
+		Pour un select, les colonnes reçoivent un type Arrow à largeur fixe déduit du modèle
+		(Numeric en decimal128, dates en date32, ...) ; dtype permet de le surcharger.
+		"""
+		sql, dtype = get_arrow_read(sql, dtype)
+		with cls.read_engine().connect() as connection:
+			connection = connection.execution_options(stream_results=True, max_row_buffer=chunksize)
+			yield from pd.read_sql(
+				sql, connection, params=params, chunksize=chunksize, dtype_backend="pyarrow", dtype=dtype or None
+			)
+
+	@classmethod
+	def query_arrow(
+			cls,
+			sql: str | Select | Query,
+			*,
+			params: Any | None = None,
+			dtype: dict | None = None,
+	):
+		"""Comme iter_dataframe, mais en un seul DataFrame Arrow lu d'une traite
+
+		Pas de morceaux gardés jusqu'à un pd.concat, qui doublerait le pic de mémoire.
+		"""
+		sql, dtype = get_arrow_read(sql, dtype)
+		with cls.read_engine().connect() as connection:
+			return pd.read_sql(sql, connection, params=params, dtype_backend="pyarrow", dtype=dtype or None)
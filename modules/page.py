@@ -2,6 +2,7 @@
 Application Streamlit avec authentification et base de données
 Structure modulaire avec streamlit-authenticator
 """
+import os
 from abc import ABC, abstractmethod
 from typing import Literal
 
@@ -9,6 +10,7 @@ import streamlit as st
 
 from modules.auth import Auth
 from modules.config import Config
+from modules.profiler import QueryProfiler
 
 
 class Page(ABC):
@@ -37,8 +39,13 @@ class Page(ABC):
 	@classmethod
 	def run(cls):
 		"""Lance l'application"""
-		cls.show_flashes()
-		cls.render()
+		QueryProfiler.start_rerun(os.path.relpath(cls.render.__func__.__code__.co_filename))
+		try:
+			cls.show_flashes()
+			cls.render()
+		finally:
+			summary = QueryProfiler.end_rerun()
+		QueryProfiler.render_panel(summary)
 		with st.sidebar:
 			if st.session_state.get('authentication_status'):
 				Auth.authenticator.logout("Se déconnecter")
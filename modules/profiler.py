@@ -0,0 +1,211 @@
+"""Instrumentation des requêtes SQL, regroupées par page et par exécution du script"""
+import json
+import math
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+from sqlalchemy import event
+
+from utils.cache import TTLCache
+
+
+class CountingCursor:
+	"""Curseur DBAPI qui ajoute les lignes lues au compteur d'une requête
+
+	sqlite3 donne rowcount = -1 pour un SELECT : les lignes rendues ne se comptent qu'à la lecture.
+	"""
+
+	def __init__(self, cursor, stat: dict):
+		self._cursor = cursor
+		self._stat = stat
+
+	def _count(self, rows: int):
+		self._stat['rows'] = (self._stat['rows'] or 0) + rows
+
+	def fetchone(self):
+		row = self._cursor.fetchone()
+		if row is not None:
+			self._count(1)
+		return row
+
+	def fetchmany(self, *args, **kwargs):
+		rows = self._cursor.fetchmany(*args, **kwargs)
+		self._count(len(rows))
+		return rows
+
+	def fetchall(self):
+		rows = self._cursor.fetchall()
+		self._count(len(rows))
+		return rows
+
+	def __iter__(self):
+		for row in self._cursor:
+			self._count(1)
+			yield row
+
+	def __getattr__(self, name):
+		return getattr(self._cursor, name)
+
+
+class Rerun:
+	"""Requêtes exécutées pendant une exécution (rerun) d'une page"""
+
+	def __init__(self, page: str, number: int):
+		self.page = page
+		self.number = number
+		self.started_at = datetime.now()
+		self.statements = {}
+
+	def record(self, fingerprint: str, duration: float, rows: int | None):
+		stat = self.statements.setdefault(fingerprint, {'durations': [], 'rows': None})
+		stat['durations'].append(duration)
+		if rows is not None:
+			stat['rows'] = (stat['rows'] or 0) + rows
+		return stat
+
+	def summary(self, n_plus_one_threshold: int):
+		queries = []
+		for fingerprint, stat in self.statements.items():
+			durations = sorted(stat['durations'])
+			p95 = durations[max(0, math.ceil(0.95 * len(durations)) - 1)]
+			queries.append({
+				'fingerprint': fingerprint,
+				'count': len(durations),
+				'total_ms': round(sum(durations) * 1000, 3),
+				'p95_ms': round(p95 * 1000, 3),
+				'rows': stat['rows'],
+				'n_plus_one': len(durations) > n_plus_one_threshold,
+			})
+		queries.sort(key=lambda query: query['total_ms'], reverse=True)
+		return {
+			'timestamp': self.started_at.isoformat(),
+			'page': self.page,
+			'rerun': self.number,
+			'queries_count': sum(query['count'] for query in queries),
+			'total_ms': round(sum(query['total_ms'] for query in queries), 3),
+			'n_plus_one': [query['fingerprint'] for query in queries if query['n_plus_one']],
+			'queries': queries,
+		}
+
+
+class QueryProfiler:
+	"""Mesure les requêtes via before/after_cursor_execute (activé dans [connections.sql.profiler])"""
+	settings = None
+	_local = threading.local()
+	_log_lock = threading.Lock()
+
+	@classmethod
+	def load_settings(cls):
+		if cls.settings is None:
+			profiler = st.secrets.get('connections', {}).get('sql', {}).get('profiler', {})
+			cls.settings = {
+				'enabled': profiler.get('enabled', False),
+				'panel': profiler.get('panel', True),
+				'log_file': profiler.get('log_file', 'logs/sql_profile.jsonl'),
+				'n_plus_one_threshold': profiler.get('n_plus_one_threshold', 5),
+			}
+		return cls.settings
+
+	@classmethod
+	def is_enabled(cls):
+		return cls.load_settings()['enabled']
+
+	@classmethod
+	def install(cls, engine):
+		"""Branche les écouteurs sur le moteur, une seule fois"""
+		if not cls.is_enabled() or getattr(engine, '_profiled', False):
+			return
+		engine._profiled = True
+		event.listen(engine, "before_cursor_execute", cls._before_cursor_execute)
+		event.listen(engine, "after_cursor_execute", cls._after_cursor_execute)
+
+	@staticmethod
+	def fingerprint(statement: str):
+		"""Forme normalisée d'une requête : littéraux remplacés par ?, listes IN repliées"""
+		statement = re.sub(r"'(?:[^']|'')*'", "?", statement)
+		statement = re.sub(r"\b\d+(?:\.\d+)?\b", "?", statement)
+		statement = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?)", statement)
+		return re.sub(r"\s+", " ", statement).strip()
+
+	@staticmethod
+	def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+		context._profiler_start = time.perf_counter()
+
+	@classmethod
+	def _after_cursor_execute(cls, conn, cursor, statement, parameters, context, executemany):
+		rerun = getattr(cls._local, 'rerun', None)
+		start = getattr(context, '_profiler_start', None)
+		if rerun is None or start is None:
+			return
+		duration = time.perf_counter() - start
+		if cursor.description is None:
+			# Écriture : rowcount donne les lignes touchées
+			rows = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else None
+			rerun.record(cls.fingerprint(statement), duration, rows)
+			return
+		# Lecture : le résultat lit context.cursor, remplacé pour compter les lignes au fil des fetch
+		stat = rerun.record(cls.fingerprint(statement), duration, 0)
+		context.cursor = CountingCursor(cursor, stat)
+
+	@classmethod
+	def start_rerun(cls, page: str):
+		if not cls.is_enabled():
+			return
+		number = st.session_state.get('sql_profiler_rerun', 0) + 1
+		st.session_state['sql_profiler_rerun'] = number
+		cls._local.rerun = Rerun(page, number)
+
+	@classmethod
+	def end_rerun(cls):
+		"""Clôt l'exécution en cours, l'écrit dans le journal JSONL et retourne son résumé"""
+		rerun = getattr(cls._local, 'rerun', None)
+		cls._local.rerun = None
+		if rerun is None:
+			return None
+		summary = rerun.summary(cls.settings['n_plus_one_threshold'])
+		summary['caches'] = TTLCache.all_stats()
+		page_cache = st.session_state.get('stsql_page_cache')
+		if page_cache is not None:
+			# Cache des pages de SqlUi, propre à la session
+			summary['caches']['stsql_page_cache'] = page_cache.stats()
+		cls.write_log(summary)
+		return summary
+
+	@classmethod
+	def write_log(cls, summary: dict):
+		log_file = cls.settings['log_file']
+		if not log_file:
+			return
+		with cls._log_lock:
+			directory = os.path.dirname(log_file)
+			if directory:
+				os.makedirs(directory, exist_ok=True)
+			with open(log_file, 'a', encoding='utf-8') as file:
+				file.write(json.dumps(summary, ensure_ascii=False) + "\n")
+
+	@classmethod
+	def render_panel(cls, summary: dict | None):
+		"""Panneau de débogage dans la barre latérale"""
+		if summary is None or not cls.settings['panel']:
+			return
+		with st.sidebar.expander(f"SQL : {summary['queries_count']} requêtes, {summary['total_ms']:.1f} ms"):
+			st.caption(f"{summary['page']} — exécution n°{summary['rerun']}")
+			for fingerprint in summary['n_plus_one']:
+				st.warning(f"N+1 suspecté : {fingerprint[:200]}")
+			if summary['queries']:
+				st.dataframe(
+					pd.DataFrame(summary['queries'])[['count', 'total_ms', 'p95_ms', 'rows', 'fingerprint']],
+					hide_index=True,
+					use_container_width=True,
+				)
+			if summary['caches']:
+				st.caption("Caches de lecture")
+				st.dataframe(
+					pd.DataFrame.from_dict(summary['caches'], orient='index'),
+					use_container_width=True,
+				)
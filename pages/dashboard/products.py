@@ -1,6 +1,7 @@
 """Page du dashboard"""
 import pandas as pd
 import plotly.express as px
+from sqlalchemy import select
 
 from database.models import Stock, Product, StockRecord, SalesDepartment
 from modules.db import DB
@@ -157,7 +158,7 @@ class Page(BasePage):
 	def get_stock_data(cls):
 		"""Récupère les données de stock depuis la base de données"""
 
-		query = DB.query(
+		stmt = select(
 			Product.name.label('product_name'),
 			Product.quantity.label('product_quantity'),
 			Product.unit.label('product_unit'),
@@ -173,17 +174,12 @@ class Page(BasePage):
 			SalesDepartment, StockRecord.id_sales_department == SalesDepartment.id
 		).order_by(Product.name, Product.quantity, StockRecord.start_date)
 
-		data = query.all()
-		df = pd.DataFrame(data)
+		df = DB.query_arrow(stmt)
 
 		# Créer un nom de produit unique combinant nom + quantité + unité
 		if not df.empty:
-			df['product_full_name'] = df.apply(
-				lambda row: f"{row['product_name']} {row['product_quantity']}{row['product_unit']}"
-				if pd.notna(row['product_quantity']) and pd.notna(row['product_unit'])
-				else row['product_name'],
-				axis=1
-			)
+			full_name = df['product_name'] + ' ' + df['product_quantity'].astype(df['product_name'].dtype) + df['product_unit']
+			df['product_full_name'] = full_name.fillna(df['product_name'])
 
 		return df
 
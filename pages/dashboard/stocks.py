@@ -3,6 +3,7 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from sqlalchemy import select
 
 from database.models import Stock, Product, StockRecord, SalesDepartment
 from modules.db import DB
@@ -13,7 +14,7 @@ class Page(BasePage):
 	@classmethod
 	def get_stock_records_data(cls):
 		"""Récupère les enregistrements de stock avec leurs données"""
-		query = DB.query(
+		stmt = select(
 			StockRecord.id.label('record_id'),
 			StockRecord.start_date,
 			StockRecord.end_date,
@@ -30,23 +31,17 @@ class Page(BasePage):
 			Product, Stock.id_product == Product.id
 		).order_by(StockRecord.start_date.desc(), Product.name)
 
-		data = query.all()
-		df = pd.DataFrame(data)
+		df = DB.query_arrow(stmt)
 
 		if not df.empty:
 			# Créer un nom de produit unique
-			df['product_full_name'] = df.apply(
-				lambda row: f"{row['product_name']} {row['product_quantity']}{row['product_unit']}"
-				if pd.notna(row['product_quantity']) and pd.notna(row['product_unit'])
-				else row['product_name'],
-				axis=1
-			)
+			full_name = df['product_name'] + ' ' + df['product_quantity'].astype(df['product_name'].dtype) + df['product_unit']
+			df['product_full_name'] = full_name.fillna(df['product_name'])
 
 			# Créer un identifiant de période
-			df['period_label'] = df.apply(
-				lambda
-					row: f"{row['department_name']} ({row['start_date'].strftime('%d/%m/%Y')} - {row['end_date'].strftime('%d/%m/%Y')})",
-				axis=1
+			df['period_label'] = (
+					df['department_name'] + ' (' + df['start_date'].dt.strftime('%d/%m/%Y')
+					+ ' - ' + df['end_date'].dt.strftime('%d/%m/%Y') + ')'
 			)
 
 		return df
@@ -4,6 +4,7 @@ from functools import partial
 from typing import Tuple, Optional
 
 import pandas as pd
+from sqlalchemy import func
 
 from database.repositories import SalesDepartmentRepository, ProductRepository, StockRecordRepository
 from modules.db import *
@@ -55,26 +56,23 @@ class Page(BasePage):
 		if params[2] is None:
 			raise ValueError("Le service commercial est obligatoire")
 
-		with DB.connection.session as session:
-			try:
-				stock_record_id = cls.get_stock_record_id(*params, session=session)
+		# Une seule transaction pour tout le fichier : rien n'est écrit si une ligne échoue
+		with DB.transaction() as session:
+			stock_record_id = cls.get_stock_record_id(*params, session=session)
 
-				for index, row in df.iterrows():
-					name = row['NOM COMMERCIAL'].strip()
-					emballage = str(row['EMBALLAGES']).strip()
-					stock = int(row['STOK'])
+			for index, row in df.iterrows():
+				name = row['NOM COMMERCIAL'].strip()
+				emballage = str(row['EMBALLAGES']).strip()
+				stock = int(row['STOK'])
 
-					# Parser l'emballage
-					quantity, unit = cls.parse_emballage(emballage)
+				# Parser l'emballage
+				quantity, unit = cls.parse_emballage(emballage)
 
-					processed_data.append({
-						'id_product': cls.get_product_id(name, quantity, unit, session=session),
-						'id_stock_record': stock_record_id,
-						'quantity': stock
-					})
-			except Exception as e:
-				session.rollback()
-				raise e
+				processed_data.append({
+					'id_product': cls.get_product_id(name, quantity, unit, session=session),
+					'id_stock_record': stock_record_id,
+					'quantity': stock
+				})
 
 		return pd.DataFrame(processed_data)
 
@@ -96,7 +94,7 @@ class Page(BasePage):
 
 	@classmethod
 	def get_product_id(cls, name: str, quantity: float, unit: str, session=None):
-		product = ProductRepository.query(session=session).filter(Product.name.like(name), Product.quantity == quantity, Product.unit == unit).first()
+		product = ProductRepository.query(session=session).filter(func.lower(Product.name) == func.lower(name), Product.quantity == quantity, Product.unit == unit).first()
 		if product:
 			return get_attr(product, 'id')
 		else:
@@ -14,7 +14,7 @@ class Page(BasePage):
 			Stock.quantity.label("Quantité")
 		).join(
 			Product, Stock.id_product == Product.id
-		), Stock, read_use_container_width=True)
+		), Stock, read_use_container_width=True, pagination_mode="keyset", fk_search_limit=50)
 
 
 Page.run()
@@ -0,0 +1,26 @@
+"""Base SQLite et configuration temporaires pour les tests qui passent par DB ou par les pages"""
+import pytest
+import streamlit as st
+
+from modules.config import Config
+from modules.db import DB
+
+
+@pytest.fixture(scope="session")
+def db(tmp_path_factory):
+	"""DB amorcé sur une base neuve ; partagé par toute la session, comme dans l'application"""
+	directory = tmp_path_factory.mktemp("db")
+	connection = st.connection
+	with pytest.MonkeyPatch.context() as patch:
+		patch.setattr(st, "connection", lambda name, **kwargs: connection(name, url=f"sqlite:///{directory / 'database.db'}", **kwargs))
+		DB.bootstrap()
+	yield DB
+	DB.connection.engine.dispose()
+
+
+@pytest.fixture
+def app(db, tmp_path, monkeypatch):
+	"""Les pages sauvegardent config.yaml à chaque exécution : on l'écrit hors du dépôt"""
+	monkeypatch.setattr(Config, "config_file", str(tmp_path / "config.yaml"))
+	monkeypatch.setattr(Config, "config", None)
+	return db
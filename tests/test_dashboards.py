@@ -0,0 +1,34 @@
+"""Les tableaux de bord se chargent sans erreur sur des données réelles"""
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from database.models import Product, SalesDepartment, Stock, StockRecord
+
+
+@pytest.fixture(scope="module")
+def stocks(db):
+	with db.transaction() as session:
+		department = SalesDepartment(name="Tableau Nord")
+		products = [
+			Product(name="Tableau engrais", quantity=Decimal("25"), unit="kg"),
+			Product(name="Tableau semences", quantity=Decimal("5"), unit=None),
+		]
+		records = [
+			StockRecord(sales_department=department, start_date=date(2024, month, 1), end_date=date(2024, month, 28))
+			for month in (1, 2)
+		]
+		session.add_all([
+			department, *products, *records,
+			*(Stock(product=product, stock_record=record, quantity=3) for product in products for record in records),
+		])
+
+
+@pytest.mark.parametrize("page", ["pages/dashboard/products.py", "pages/dashboard/stocks.py"])
+def test_dashboard_renders(app, stocks, page):
+	at = AppTest.from_file(page, default_timeout=60).run()
+	assert not at.exception
+	assert [error.value for error in at.error] == []
+	assert not at.warning
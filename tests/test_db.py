@@ -0,0 +1,48 @@
+"""Lectures de DB : DataFrames Arrow, copie en mémoire"""
+from decimal import Decimal
+
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import select
+
+from database.models import Product
+from modules.db import ReadReplica
+
+
+def test_query_arrow_types(db):
+	with db.transaction() as session:
+		session.add(Product(name="Arrow sel", quantity=Decimal("2.5"), unit=None))
+	stmt = select(Product.name, Product.quantity, Product.unit).where(Product.name == "Arrow sel")
+
+	df = db.query_arrow(stmt)
+	assert df['name'].dtype == pd.ArrowDtype(pa.string())
+	assert df['quantity'].dtype == pd.ArrowDtype(pa.decimal128(10, 2))
+	assert df['quantity'].tolist() == [Decimal("2.50")]
+	assert df['unit'].isna().all()
+	# Même résultat que les morceaux d'iter_dataframe
+	chunks = pd.concat(db.iter_dataframe(stmt, chunksize=1), ignore_index=True)
+	pd.testing.assert_frame_equal(df, chunks)
+
+
+def test_query_arrow_empty(db):
+	df = db.query_arrow(select(Product.name).where(Product.name == "Arrow introuvable"))
+	assert df.empty
+	assert list(df.columns) == ["name"]
+
+
+def test_replica_query_dataframe_keeps_cache_arguments(db, monkeypatch):
+	monkeypatch.setattr(db, "_replica", ReadReplica(db.connection.engine))
+	with db.transaction() as session:
+		session.add(Product(name="Réplique engrais", quantity=Decimal("1"), unit="kg"))
+	sql = "SELECT name, quantity FROM products WHERE name LIKE 'Réplique%' ORDER BY id"
+
+	df = db.query_dataframe(sql, ttl=600, dtype={'quantity': "float32"})
+	assert df['name'].tolist() == ["Réplique engrais"]
+	assert df['quantity'].dtype == "float32"
+
+	with db.transaction() as session:
+		session.add(Product(name="Réplique mil", quantity=Decimal("1"), unit="kg"))
+	# Résultat en cache pendant le ttl, comme avec SQLConnection.query
+	assert db.query_dataframe(sql, ttl=600, dtype={'quantity': "float32"})['name'].tolist() == ["Réplique engrais"]
+	# Sans ttl, une autre entrée : lue sur la copie rafraîchie
+	assert db.query_dataframe(sql, dtype={'quantity': "float32"})['name'].tolist() == ["Réplique engrais", "Réplique mil"]
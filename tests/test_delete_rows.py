@@ -0,0 +1,79 @@
+"""DeleteRows : suppression par morceaux, lignes dépendantes et libellés des lignes supprimées"""
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import func, select
+
+from database.models import Product, SalesDepartment, Stock, StockRecord
+from utils.crud.create_delete_model import DeleteRows
+
+
+@pytest.fixture(params=[True, False], ids=["returning", "select"])
+def returning(request, db, monkeypatch):
+	monkeypatch.setattr(db.connection.engine.dialect, "delete_returning", request.param)
+	return request.param
+
+
+@pytest.fixture
+def rows(db):
+	with db.transaction() as session:
+		department = SalesDepartment(name="Suppression Louga")
+		records = [
+			StockRecord(sales_department=department, start_date=date(2022, 1, day), end_date=date(2022, 1, 28))
+			for day in (1, 2)
+		]
+		products = [Product(name=f"Suppression {i}", quantity=Decimal("5"), unit="kg") for i in range(3)]
+		stocks = [Stock(product=product, stock_record=record, quantity=1) for product in products for record in records]
+		session.add_all([department, *records, *products, *stocks])
+		session.flush()
+		return {
+			'records': [record.id for record in records],
+			'products': [product.id for product in products],
+			'stocks': {(stock.id_product, stock.id_stock_record): stock.id for stock in stocks},
+		}
+
+
+def delete(db, model, ids, chunk_size=500):
+	ui = DeleteRows(db.connection, model, ids)
+	ui.chunk_size = chunk_size
+	ui.labels = ui.get_labels(ids)
+	with db.connection.session as session:
+		result = ui.delete_rows(session)
+		session.commit()
+	return result
+
+
+def remaining(db, model, ids):
+	with db.connection.session as session:
+		return session.scalar(select(func.count()).select_from(model).where(model.id.in_(ids)))
+
+
+def test_delete_product_deletes_its_stocks(db, rows, returning):
+	product_id = rows['products'][0]
+	deleted, dependents = delete(db, Product, [product_id, 999999])
+	assert deleted == {product_id: "Suppression 0 (5.00 kg)"}
+	assert dependents == {'stocks': 2}
+	assert remaining(db, Product, [product_id]) == 0
+	assert remaining(db, Stock, list(rows['stocks'].values())) == 4
+
+
+def test_delete_stock_records_in_chunks(db, rows, returning):
+	deleted, dependents = delete(db, StockRecord, rows['records'], chunk_size=1)
+	assert set(deleted) == set(rows['records'])
+	assert all(label.startswith("Suppression Louga (") for label in deleted.values())
+	assert dependents == {'stocks': 6}
+	assert remaining(db, Stock, list(rows['stocks'].values())) == 0
+	assert remaining(db, Product, rows['products']) == 3
+
+
+def test_stock_labels_come_from_the_dialog(db, rows, returning):
+	stock_id = rows['stocks'][(rows['products'][1], rows['records'][0])]
+	deleted, dependents = delete(db, Stock, [stock_id])
+	assert deleted == {stock_id: "Suppression 1 (5.00 kg) (Suppression Louga (01/01/2022 - 28/01/2022))"}
+	assert dependents == {}
+
+
+def test_schema_has_no_database_cascade():
+	# Les bases existantes n'ont pas ON DELETE CASCADE : le modèle non plus
+	assert all(fk.ondelete is None for fk in Stock.__table__.foreign_keys)
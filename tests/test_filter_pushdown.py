@@ -0,0 +1,29 @@
+"""Les filtres de SqlUi poussés dans le select d'origine doivent passer par les index"""
+import pytest
+from sqlalchemy import create_engine
+
+from benchmarks.filter_pushdown import get_plan, get_statements, populate
+
+# Index que chaque table doit parcourir en SEARCH dans le plan de la requête poussée
+EXPECTED_INDEXES = {
+	'stock_records': "ix_stock_records_department_dates",
+	'stocks': "ix_stocks_id_stock_record",
+}
+
+
+@pytest.fixture(scope="module")
+def plan(tmp_path_factory):
+	engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('pushdown') / 'pushdown.db'}")
+	populate(engine, 20000)
+	with engine.connect() as connection:
+		yield get_plan(connection, get_statements()["pushdown"])
+	engine.dispose()
+
+
+@pytest.mark.parametrize("table, index", EXPECTED_INDEXES.items())
+def test_pushdown_uses_index(plan, table, index):
+	assert any(step.startswith(f"SEARCH {table} USING") and f"INDEX {index} " in f"{step} " for step in plan), plan
+
+
+def test_pushdown_is_not_materialized(plan):
+	assert not [step for step in plan if step.startswith("MATERIALIZE")], plan
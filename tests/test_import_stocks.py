@@ -0,0 +1,102 @@
+"""Import des stocks : recherche des produits et transaction unique"""
+import importlib
+from datetime import date
+from functools import partial
+
+import pandas as pd
+import pytest
+from sqlalchemy import event, func, select
+
+from database.models import Product, SalesDepartment, Stock, StockRecord
+from utils.crud.ie import DynamicImportExport
+
+
+@pytest.fixture
+def page(app):
+	return importlib.import_module("pages.management.import_stocks").Page
+
+
+def test_product_lookup_ignores_case_like_sqlite(page, db):
+	with db.transaction() as session:
+		first = page.get_product_id("ÉLEVAGE BIO", 25.0, "kg", session=session)
+		second = page.get_product_id("ÉLEVAGE BIO", 25.0, "kg", session=session)
+		lower = page.get_product_id("Élevage bio", 25.0, "kg", session=session)
+	assert first == second == lower
+
+
+def test_product_lookup_uses_index(page, db):
+	statements = []
+
+	def listener(conn, cursor, statement, parameters, context, executemany):
+		if statement.startswith("SELECT") and "FROM products" in statement:
+			statements.append((statement, parameters))
+
+	event.listen(db.connection.engine, "before_cursor_execute", listener)
+	try:
+		with db.transaction() as session:
+			page.get_product_id("Index engrais", 50.0, "kg", session=session)
+	finally:
+		event.remove(db.connection.engine, "before_cursor_execute", listener)
+
+	statement, parameters = statements[0]
+	with db.connection.engine.connect() as connection:
+		plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+	assert any("USING INDEX ix_products_name_lower_quantity_unit" in step[-1] for step in plan), plan
+
+
+@pytest.fixture
+def importer(page, db):
+	with db.transaction() as session:
+		department = SalesDepartment(name="Import Sine")
+		session.add(department)
+		session.flush()
+		department_id = department.id
+	# Comme SalesDepartmentRepository.find_all() pour la page : chargé, hors session
+	with db.connection.session as session:
+		department = session.get(SalesDepartment, department_id)
+	params = (date(2023, 6, 1), date(2023, 6, 30), department)
+	return DynamicImportExport(db.connection, Stock, process_imported_dataframe=partial(page.process_dataframe, params))
+
+
+def count_rows(db):
+	with db.connection.session as session:
+		return {
+			model.__name__: session.scalar(select(func.count()).select_from(model))
+			for model in (Product, StockRecord, Stock)
+		}
+
+
+def stock_file(name):
+	return pd.DataFrame({
+		'NOM COMMERCIAL': [f"{name} urée", f"{name} NPK"],
+		'EMBALLAGES': ["50 KG", "25KG"],
+		'STOK': [12, 7],
+	})
+
+
+def test_import_preview_writes_nothing(importer, db):
+	before = count_rows(db)
+	preview = importer.preview_imported_dataframe(stock_file("Aperçu"))
+	assert len(preview) == 2
+	assert count_rows(db) == before
+
+
+def test_failed_import_leaves_nothing(importer, db, monkeypatch):
+	def fail(model_class):
+		raise RuntimeError("échec de l'insertion")
+
+	monkeypatch.setattr(DynamicImportExport, "get_model_columns", staticmethod(fail))
+	before = count_rows(db)
+	result = importer.import_table_data(stock_file("Échec"))
+	assert not result["success"]
+	assert count_rows(db) == before
+
+
+def test_import_writes_products_record_and_stocks(importer, db):
+	before = count_rows(db)
+	result = importer.import_table_data(stock_file("Réussi"))
+	assert result["success"], result
+	after = count_rows(db)
+	assert after['Product'] == before['Product'] + 2
+	assert after['StockRecord'] == before['StockRecord'] + 1
+	assert after['Stock'] == before['Stock'] + 2
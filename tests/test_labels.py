@@ -0,0 +1,38 @@
+"""Les libellés calculés en SQL (__label__) doivent être identiques à str() des objets"""
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from database.models import Base, Product, SalesDepartment, Stock, StockRecord, User
+
+
+def test_label_matches_str():
+	engine = create_engine("sqlite://")
+	Base.metadata.create_all(engine)
+	with Session(engine) as session:
+		department = SalesDepartment(name="Service Nord")
+		products = [
+			Product(name="Engrais", quantity=Decimal("25"), unit="kg"),
+			Product(name="Semences", quantity=Decimal("5"), unit=None),
+			Product(name="Huile", quantity=Decimal("0.75"), unit="l"),
+		]
+		record = StockRecord(sales_department=department, start_date=date(2024, 1, 5), end_date=date(2024, 12, 31))
+		session.add_all([
+			User(email="a@b.c", first_name="Awa", last_name="Diallo", password="x", roles=[]),
+			department,
+			*products,
+			record,
+			*(Stock(product=product, stock_record=record, quantity=3) for product in products),
+		])
+		session.commit()
+
+		models = [mapper.class_ for mapper in Base.registry.mappers if mapper.class_.__label__() is not None]
+		assert models
+		for model in models:
+			labels = {idx: label for idx, label in session.execute(model.__label__())}
+			assert labels, model
+			for row in session.query(model):
+				assert labels[row.id] == str(row), model
+	engine.dispose()
@@ -0,0 +1,82 @@
+"""Migrator : versions appliquées une fois, sur une base neuve comme sur une base d'avant les migrations"""
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+
+from database.migrations import MIGRATIONS, Migrator, schema_version
+from database.models import Base
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+	# Chaque test repart d'un processus neuf pour le Migrator
+	monkeypatch.setattr(Migrator, "_done", False)
+	monkeypatch.setattr(Migrator, "timings", {})
+	engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+	yield engine
+	engine.dispose()
+
+
+def get_versions(engine):
+	with engine.connect() as connection:
+		return connection.execute(select(schema_version.c.version, schema_version.c.name)).all()
+
+
+def get_indexes(engine):
+	with engine.connect() as connection:
+		return set(connection.scalars(text("SELECT name FROM sqlite_master WHERE type = 'index'")))
+
+
+def test_migrations_apply_in_order(engine):
+	timings = Migrator.run(engine)
+	assert list(timings) == [func.__name__ for func in MIGRATIONS]
+	assert get_versions(engine) == [(version, func.__name__) for version, func in enumerate(MIGRATIONS, start=1)]
+
+	tables = set(inspect(engine).get_table_names())
+	assert set(Base.metadata.tables) <= tables
+	assert {'ix_stocks_id_stock_record', 'ix_products_name_lower', 'ix_products_name_lower_quantity_unit'} <= get_indexes(engine)
+
+
+def test_migrations_run_once(engine, monkeypatch):
+	Migrator.run(engine)
+	indexes = get_indexes(engine)
+
+	# Nouveau processus : rien à appliquer, aucune erreur sur les index déjà créés
+	monkeypatch.setattr(Migrator, "_done", False)
+	monkeypatch.setattr(Migrator, "timings", {})
+	assert Migrator.run(engine) == {}
+	assert len(get_versions(engine)) == len(MIGRATIONS)
+	assert get_indexes(engine) == indexes
+
+
+def test_migrations_upgrade_a_database_created_before_them(engine):
+	# Base créée par l'ancien create_all : tables et index des modèles, sans schema_version
+	Base.metadata.create_all(engine)
+	with engine.begin() as connection:
+		connection.execute(text("INSERT INTO sales_departments (name) VALUES ('Avant migrations')"))
+
+	Migrator.run(engine)
+	assert len(get_versions(engine)) == len(MIGRATIONS)
+	with engine.connect() as connection:
+		assert connection.scalar(text("SELECT name FROM sales_departments")) == "Avant migrations"
+	assert 'ix_products_name_lower_quantity_unit' in get_indexes(engine)
+
+
+def test_failed_migration_is_not_recorded(engine, monkeypatch):
+	def broken(connection):
+		connection.execute(text("CREATE TABLE broken_migration (id INTEGER)"))
+		raise RuntimeError("migration en échec")
+
+	monkeypatch.setattr(Migrator, "migrations", [*MIGRATIONS, broken])
+	with pytest.raises(RuntimeError):
+		Migrator.run(engine)
+	assert len(get_versions(engine)) == len(MIGRATIONS)
+	assert 'broken_migration' not in inspect(engine).get_table_names()
+	assert not Migrator._done
+
+	# Corrigée, elle s'applique au lancement suivant sans trouver de reste de l'échec
+	def fixed(connection):
+		connection.execute(text("CREATE TABLE broken_migration (id INTEGER)"))
+
+	monkeypatch.setattr(Migrator, "migrations", [*MIGRATIONS, fixed])
+	Migrator.run(engine)
+	assert get_versions(engine)[-1] == (len(MIGRATIONS) + 1, "fixed")
@@ -0,0 +1,110 @@
+"""read_cte : pagination par clé et solde cumulé, comparés à OFFSET et à une somme en Python"""
+from datetime import date, timedelta
+from itertools import accumulate
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import Column, Date, Integer, MetaData, Table, create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from utils.crud import read_cte
+
+ledger = Table(
+	"ledger_read_cte",
+	MetaData(),
+	Column("id", Integer, primary_key=True),
+	Column("day", Date, nullable=False),
+	Column("amount", Integer, nullable=False),
+)
+ROWS = [
+	{'id': i, 'day': date(2024, 1, 1) + timedelta(days=(i * 7) % 13), 'amount': (i * 37) % 23 - 11}
+	for i in range(1, 46)
+]
+LIMIT = 2
+assert read_cte.BALANCE_COLUMN == "stsql_balance"
+
+
+@pytest.fixture(scope="module")
+def session(tmp_path_factory):
+	engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('read_cte') / 'ledger.db'}")
+	ledger.create(engine)
+	with engine.begin() as connection:
+		connection.execute(insert(ledger), ROWS)
+	with Session(engine) as session:
+		yield session
+	engine.dispose()
+
+
+def get_filter(dt_filters=None):
+	return SimpleNamespace(no_dt_filters={}, search_filters={}, fulltext=None, dt_filters=dt_filters or {})
+
+
+def get_ordered(descending=False):
+	return sorted(ROWS, key=lambda row: (row['day'], row['id']), reverse=descending)
+
+
+@pytest.mark.parametrize("descending", [False, True], ids=["asc", "desc"])
+def test_keyset_pages_match_offset_pages(session, descending):
+	stmt_no_pag = select(ledger)
+	keyset_cols = read_cte.get_keyset_cols(stmt_no_pag, ["day"])
+	assert [col.name for col in keyset_cols] == ["day", "id"]
+	expected = [row['id'] for row in get_ordered(descending)]
+
+	pages = -(-len(ROWS) // LIMIT)
+	assert pages > read_cte.KEYSET_INDEX_STRIDE
+	cursor = None
+	for page in range(1, pages + 1):
+		# Sans curseur : borne de l'index des pages, puis décalage
+		stmt = read_cte.get_stmt_pag_keyset(session, stmt_no_pag, keyset_cols, LIMIT, page, descending=descending)
+		ids = [row.id for row in session.execute(stmt)]
+		assert ids == expected[(page - 1) * LIMIT:page * LIMIT]
+
+		# Avec le curseur de la page précédente : « clé > dernière clé », sans décalage
+		stmt = read_cte.get_stmt_pag_keyset(session, stmt_no_pag, keyset_cols, LIMIT, page, cursor, descending)
+		rows = session.execute(stmt).all()
+		assert [row.id for row in rows] == ids
+		if page > 1:
+			assert stmt._offset_clause is None
+		cursor = (page, LIMIT, (rows[-1].day, rows[-1].id))
+
+
+def test_balance_matches_running_sum(session):
+	stmt = read_cte.get_stmt_balance(select(ledger), get_filter(), "amount", ["day"])
+	rows = session.execute(stmt.order_by(stmt.selected_columns.day, stmt.selected_columns.id)).all()
+	expected = list(accumulate(row['amount'] for row in get_ordered()))
+	assert [row.id for row in rows] == [row['id'] for row in get_ordered()]
+	assert [row.stsql_balance for row in rows] == expected
+
+
+def test_balance_includes_rows_before_the_period(session):
+	start = date(2024, 1, 6)
+	stmt = read_cte.get_stmt_balance(select(ledger), get_filter({'day': (start, None)}), "amount", ["day"])
+	rows = session.execute(stmt.order_by(stmt.selected_columns.day, stmt.selected_columns.id)).all()
+	ordered = get_ordered()
+	balances = dict(zip((row['id'] for row in ordered), accumulate(row['amount'] for row in ordered)))
+	assert rows and all(row.day >= start for row in rows)
+	assert rows[0].stsql_balance != rows[0].amount
+	assert {row.id: row.stsql_balance for row in rows} == {
+		row['id']: balances[row['id']] for row in ordered if row['day'] >= start
+	}
+
+
+@pytest.mark.parametrize("with_cursor", [True, False], ids=["cursor", "index"])
+def test_balance_from_checkpoint_matches_full_window(session, with_cursor):
+	stmt_no_pag = select(ledger)
+	keyset_cols = read_cte.get_keyset_cols(stmt_no_pag, ["day"])
+	expected = list(accumulate(row['amount'] for row in get_ordered()))
+
+	cursor = None
+	checkpoints = 0
+	for page in range(1, -(-len(ROWS) // LIMIT) + 1):
+		seek = read_cte.get_keyset_seek(session, stmt_no_pag, keyset_cols, LIMIT, page, cursor)
+		checkpoint = read_cte.get_balance_checkpoint(session, stmt_no_pag, keyset_cols, "amount", 7, seek)
+		checkpoints += checkpoint is not None
+		stmt = read_cte.get_stmt_balance(select(ledger), get_filter(), "amount", ["day"], checkpoint)
+		stmt = read_cte.apply_keyset_seek(stmt, read_cte.get_keyset_cols(stmt, ["day"]), LIMIT, seek)
+		rows = session.execute(stmt).all()
+		assert [row.stsql_balance for row in rows] == expected[(page - 1) * LIMIT:page * LIMIT]
+		if with_cursor:
+			cursor = (page, LIMIT, (rows[-1].day, rows[-1].id))
+	assert checkpoints > 0
@@ -0,0 +1,142 @@
+"""Repository : écritures en masse, cache des tables de référence, parcours par pages"""
+import sqlite3
+
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import object_session
+
+from database.models import Product, SalesDepartment
+from database.repositories import ProductRepository, Repository, SalesDepartmentRepository
+from utils.cache import Generations
+
+
+@pytest.fixture(params=[True, False], ids=["returning", "select"])
+def bulk(request, db, monkeypatch):
+	"""Morceaux de 2 lignes, avec ou sans RETURNING"""
+	dialect = db.connection.engine.dialect
+	monkeypatch.setattr(dialect, "insert_executemany_returning", request.param)
+	monkeypatch.setattr(dialect, "delete_returning", request.param)
+	monkeypatch.setattr(ProductRepository, "chunk_size", 2)
+
+
+def get_products(db, ids):
+	with db.connection.session as session:
+		rows = session.scalars(select(Product).where(Product.id.in_(ids)).order_by(Product.id))
+		return [(row.id, row.name, row.quantity) for row in rows]
+
+
+def test_bulk_create_update_delete(db, bulk):
+	ids = ProductRepository.create_many([{'name': f"Masse {i}", 'quantity': i, 'unit': "kg"} for i in range(5)])
+	assert len(ids) == 5 and ids == sorted(ids)
+	assert [name for _, name, _ in get_products(db, ids)] == [f"Masse {i}" for i in range(5)]
+
+	# Les ids absents sont ignorés
+	updated = ProductRepository.update_many([{'id': idx, 'quantity': 10} for idx in ids[:3]] + [{'id': 999999, 'quantity': 1}])
+	assert updated == ids[:3]
+	assert [quantity for _, _, quantity in get_products(db, ids)] == [10, 10, 10, 3, 4]
+
+	generation = Generations.get("products")
+	deleted = ProductRepository.delete_many([*ids[1:4], 999999])
+	assert sorted(deleted) == ids[1:4]
+	assert [idx for idx, _, _ in get_products(db, ids)] == [ids[0], ids[4]]
+	assert Generations.get("products") != generation
+
+
+def test_bulk_writes_follow_the_transaction(db, bulk):
+	ids = ProductRepository.create_many([{'name': f"Annulé {i}", 'quantity': 1, 'unit': "l"} for i in range(3)])
+	with pytest.raises(RuntimeError):
+		with db.transaction():
+			Repository.create_many(Product, [{'name': "Annulé 3", 'quantity': 1, 'unit': "l"}])
+			ProductRepository.update_many([{'id': ids[0], 'name': "Modifié"}])
+			ProductRepository.delete_many(ids[1:])
+			raise RuntimeError
+	assert [name for _, name, _ in get_products(db, ids)] == ["Annulé 0", "Annulé 1", "Annulé 2"]
+	with db.connection.session as session:
+		assert session.scalar(select(func.count()).select_from(Product).where(Product.name == "Annulé 3")) == 0
+
+
+def test_bulk_params_are_checked(db):
+	with pytest.raises(ValueError):
+		ProductRepository.create_many({'name': "Pas une liste"})
+	with pytest.raises(ValueError):
+		ProductRepository.update_many([{'name': "Sans id"}])
+	with pytest.raises(ValueError):
+		ProductRepository.delete_many(["1"])
+	with pytest.raises(ValueError):
+		Repository.delete_many([1])
+
+
+def test_cache_returns_fresh_detached_rows(db):
+	department = SalesDepartmentRepository.create({'name': "Cache Kolda"})
+	first = SalesDepartmentRepository.find_by_id(department['id'])
+	hits = SalesDepartmentRepository.cache_stats()['hits']
+	second = SalesDepartmentRepository.find_by_id(department['id'])
+	assert SalesDepartmentRepository.cache_stats()['hits'] == hits + 1
+
+	# Chaque appel a son objet : une modification ne se voit pas ailleurs
+	assert first is not second
+	first.name = "Modifié"
+	assert second.name == "Cache Kolda"
+	assert SalesDepartmentRepository.find_by_id(department['id']).name == "Cache Kolda"
+	assert object_session(second) is None
+
+	listed = {row.id: row for row in SalesDepartmentRepository.find_all()}
+	assert listed[department['id']] is not second
+	assert str(listed[department['id']]) == "Cache Kolda"
+
+
+def test_cached_row_can_join_a_session(db):
+	department = SalesDepartmentRepository.create({'name': "Cache Matam"})
+	row = SalesDepartmentRepository.find_by_id(department['id'])
+	with db.transaction() as session:
+		# Objet détaché, déjà en base : rattaché sans INSERT, relations chargeables
+		session.add(row)
+		assert row.stock_records == []
+	assert SalesDepartmentRepository.find_by_id(department['id']) is not None
+	with db.connection.session as session:
+		assert session.query(SalesDepartment).filter_by(name="Cache Matam").count() == 1
+
+
+@pytest.fixture
+def departments(db):
+	return SalesDepartmentRepository.create_many([{'name': f"Page {i}"} for i in range(7)])
+
+
+def test_iter_pages_reads_each_page_after_the_last_id(db, departments):
+	statements = []
+	listen = lambda conn, cursor, statement, *args: statements.append(statement)
+	event.listen(db.connection.engine, "before_cursor_execute", listen)
+	try:
+		pages = list(SalesDepartmentRepository.iter_pages(
+			batch_size=3, where=SalesDepartment.id >= departments[0], columns=["name"],
+		))
+	finally:
+		event.remove(db.connection.engine, "before_cursor_execute", listen)
+
+	assert [len(page) for page in pages] == [3, 3, 1]
+	assert [row.id for page in pages for row in page] == departments
+	assert [row.name for row in pages[2]] == ["Page 6"]
+	assert len(statements) == 3
+	assert all("LIMIT" in statement for statement in statements)
+	assert ["sales_departments.id > ?" in statement for statement in statements] == [False, True, True]
+
+	rows = SalesDepartmentRepository.iter_rows(batch_size=2, after_id=departments[4])
+	assert [row.id for row in rows] == departments[5:]
+
+
+def test_iter_pages_rows_stay_attached(db, departments):
+	for page in SalesDepartmentRepository.iter_pages(batch_size=3, where=SalesDepartment.id.in_(departments)):
+		assert all(object_session(row) is object_session(page[0]) is not None for row in page)
+		assert page[0].stock_records == []
+
+
+def test_iter_pages_holds_no_snapshot_between_pages(db, departments):
+	# Un checkpoint du WAL entre deux pages n'est bloqué par aucun lecteur
+	pages = SalesDepartmentRepository.iter_pages(batch_size=3, where=SalesDepartment.id.in_(departments))
+	next(pages)
+	with sqlite3.connect(db.connection.engine.url.database) as connection:
+		connection.execute("INSERT INTO sales_departments (name) VALUES ('Checkpoint')")
+		connection.commit()
+		busy, _, _ = connection.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+	assert busy == 0
+	assert sum(len(page) for page in pages) == 4
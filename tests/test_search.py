@@ -0,0 +1,75 @@
+"""Recherche plein texte : FTS5 sous SQLite, LIKE à défaut, et à travers les clés étrangères"""
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from streamlit.testing.v1 import AppTest
+
+from database.models import Base, Product, SalesDepartment, Stock, StockRecord
+from database.search import FullTextSearch
+
+
+def populate(session):
+	department = SalesDepartment(name="Recherche Casamance")
+	record = StockRecord(sales_department=department, start_date=date(2024, 3, 1), end_date=date(2024, 3, 31))
+	products = [
+		Product(name="Recherche arachide décortiquée", quantity=Decimal("50"), unit="kg"),
+		Product(name="Recherche mil", quantity=Decimal("25"), unit="kg"),
+	]
+	stocks = [Stock(product=product, stock_record=record, quantity=4) for product in products]
+	session.add_all([department, record, *products, *stocks])
+	session.flush()
+	return {'department': department, 'record': record, 'products': products, 'stocks': stocks}
+
+
+def found(session, bind, model, search):
+	ranked = FullTextSearch.get_ranked(bind, model, search)
+	return set(session.scalars(select(ranked.c.id)))
+
+
+@pytest.fixture(params=["fts", "like"])
+def searched(request, db, tmp_path):
+	"""Les deux chemins : tables FTS5 de la base des migrations, LIKE sur une base sans elles"""
+	if request.param == "fts":
+		with db.transaction() as session:
+			rows = populate(session)
+			yield session, db.connection.engine, rows
+		return
+	engine = create_engine(f"sqlite:///{tmp_path / 'like.db'}")
+	Base.metadata.create_all(engine)
+	with Session(engine) as session:
+		yield session, engine, populate(session)
+	engine.dispose()
+
+
+def test_search_own_columns(searched):
+	session, bind, rows = searched
+	arachide, mil = rows['products']
+	assert arachide.id in found(session, bind, Product, "arachide")
+	assert mil.id not in found(session, bind, Product, "arachide")
+	assert not found(session, bind, Product, "arachide introuvable")
+
+
+def test_search_through_foreign_keys(searched):
+	session, bind, rows = searched
+	arachide_stock, mil_stock = rows['stocks']
+	# Par le produit
+	assert found(session, bind, Stock, "arachide") >= {arachide_stock.id}
+	assert mil_stock.id not in found(session, bind, Stock, "arachide")
+	# Par le service de l'enregistrement, à deux clés de distance
+	assert found(session, bind, Stock, "Casamance") >= {arachide_stock.id, mil_stock.id}
+	assert rows['record'].id in found(session, bind, StockRecord, "Casamance")
+
+
+def test_stock_page_has_search(app):
+	with app.transaction() as session:
+		stock_id = populate(session)['stocks'][0].id
+	at = AppTest.from_file("pages/management/stocks.py", default_timeout=60).run()
+	search = next(text_input for text_input in at.text_input if text_input.label == "Rechercher")
+	search.input("décortiquée").run()
+	assert not at.exception
+	df = at.dataframe[0].value
+	assert stock_id in df["id"].tolist()
+	assert df["Produit"].str.contains("décortiquée").all()
@@ -0,0 +1,32 @@
+"""Saisie assistée des clés étrangères : recherche par préfixe du libellé"""
+from decimal import Decimal
+
+import pytest
+from streamlit import session_state as ss
+
+from database.models import Product, Stock
+from utils.crud.filters import ExistingData
+
+
+@pytest.fixture
+def existing_data(db):
+	with db.transaction() as session:
+		session.add_all([
+			Product(name="Élevage préfixe", quantity=Decimal("10"), unit="kg"),
+			Product(name="Engrais préfixe", quantity=Decimal("10"), unit="kg"),
+		])
+	ss["stsql_updated"] = 0
+	with db.connection.session as session:
+		return ExistingData(session, Stock, {}, search_limit=20, conn=db.connection)
+
+
+@pytest.mark.parametrize("search", ["Élev", "ÉLEV", "  ÉLEVAGE P"])
+def test_search_fk_finds_accented_initial(existing_data, search):
+	names = [opt.name for opt in existing_data.search_fk("id_product", search)]
+	assert "Élevage préfixe (10.00 kg)" in names
+
+
+def test_search_fk_prefix_only(existing_data):
+	names = [opt.name for opt in existing_data.search_fk("id_product", "Engrais pr")]
+	assert "Engrais préfixe (10.00 kg)" in names
+	assert "Élevage préfixe (10.00 kg)" not in names
@@ -0,0 +1,70 @@
+"""Rendu des tableaux de SqlUi : formats en st.column_config, styles sans pandas Styler"""
+import json
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from utils.crud.lib import get_column_format
+
+
+@pytest.mark.parametrize("fmt, expected", [
+	("{:,.2f}", "%.2f"),
+	("{:.2f}", "%.2f"),
+	("{:,d}", "%d"),
+	("{:f}", "%.6f"),
+	("{:.1f} kg", "%.1f kg"),
+	("{:.0f} %", "%d %%"),
+	("{:,}", "localized"),
+])
+def test_number_formats(fmt, expected):
+	column = get_column_format(fmt, pd.Series([25.5, 1234.0]))
+	assert column["type_config"] == {**column["type_config"], 'type': "number", 'format': expected}
+
+
+def test_date_format():
+	column = get_column_format("{:%d/%m/%Y}", pd.Series([date(2024, 1, 5)]))
+	assert column["type_config"]["type"] == "date"
+	assert column["type_config"]["format"] == "DD[/]MM[/]YYYY"
+
+
+def test_unsupported_format_falls_back_to_styler():
+	assert get_column_format("{:+.2f}", pd.Series([1.0])) is None
+
+
+def render(row_style_fn):
+	import pandas as pd
+	import streamlit as st
+	from sqlalchemy import Column, Integer, MetaData, Numeric, Table, select
+
+	from utils.crud.sql_iu import SqlUi
+
+	table = Table("render", MetaData(), Column("id", Integer, primary_key=True), Column("amount", Numeric(10, 2)))
+	ui = SqlUi.__new__(SqlUi)
+	ui.cte = select(table).cte()
+	ui.df_style_formatter = {"amount": "{:,.2f}"}
+	ui.rolling_total_column = None
+	ui.style_fn = None
+	ui.row_style_fn = row_style_fn
+	ui.hide_id = True
+	ui.read_use_container_width = False
+	ui.base_key = "render"
+	ui.data_container = st.container()
+	df = pd.DataFrame({"id": [1, 2], "amount": [25.5, -3.0]})
+	st.session_state["styled"] = type(ui.style_df(df, {})).__name__
+	ui.show_df(df)
+
+
+def test_row_style_fn_uses_a_marker_column():
+	at = AppTest.from_function(
+		render, kwargs={'row_style_fn': lambda frame: np.where(frame["amount"] > 0, "🟢", "🔴")}
+	).run()
+	assert not at.exception
+	assert at.session_state["styled"] == "DataFrame"
+	df = at.dataframe[0].value
+	assert df["stsql_row_marker"].tolist() == ["🟢", "🔴"]
+	proto = at.dataframe[0].proto
+	assert list(proto.column_order) == ["stsql_row_marker", "amount"]
+	assert json.loads(proto.columns)["stsql_row_marker"]["pinned"] is True
@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class Generations:
+	"""Compteurs d'écriture du processus : un compteur global et un par table
+
+	Toute lecture mise en cache retient la génération des tables lues ; une écriture
+	incrémente le compteur et rend ces lectures obsolètes.
+	"""
+	_lock = threading.Lock()
+	_global = 0
+	_tables = {}
+	_hooks = []
+
+	@classmethod
+	def subscribe(cls, hook):
+		"""hook(*tables) est appelé après chaque incrément, pour évincer les lectures obsolètes"""
+		cls._hooks.append(hook)
+		return hook
+
+	@classmethod
+	def bump(cls, *tables):
+		with cls._lock:
+			cls._global += 1
+			for table in tables:
+				cls._tables[table] = cls._tables.get(table, 0) + 1
+			generation = cls._global
+		if tables:
+			for hook in cls._hooks:
+				hook(*tables)
+		return generation
+
+	@classmethod
+	def get(cls, *tables):
+		if not tables:
+			return cls._global
+		return tuple(cls._tables.get(table, 0) for table in tables)
+
+
+class TTLCache:
+	"""Cache LRU borné en nombre d'entrées et en durée de vie, partageable entre threads
+
+	Un cache nommé est inscrit dans TTLCache.registry pour en suivre les statistiques.
+	"""
+	registry = {}
+
+	def __init__(self, maxsize: int = 1024, ttl: float = 300, name: str | None = None):
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self.name = name
+		self.hits = 0
+		self.misses = 0
+		self._data = OrderedDict()
+		self._lock = threading.Lock()
+		if name is not None:
+			TTLCache.registry[name] = self
+
+	def __len__(self):
+		return len(self._data)
+
+	def __contains__(self, key):
+		return self.get(key, _MISSING) is not _MISSING
+
+	def get(self, key, default=None):
+		with self._lock:
+			item = self._data.get(key, _MISSING)
+			if item is _MISSING or item[1] < time.monotonic():
+				if item is not _MISSING:
+					del self._data[key]
+				self.misses += 1
+				return default
+			self._data.move_to_end(key)
+			self.hits += 1
+			return item[0]
+
+	def set(self, key, value):
+		with self._lock:
+			self._data[key] = (value, time.monotonic() + self.ttl)
+			self._data.move_to_end(key)
+			while len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+		return value
+
+	def get_or_set(self, key, func):
+		"""Retourne la valeur en cache ou la calcule (hors verrou) avec func()"""
+		value = self.get(key, _MISSING)
+		if value is _MISSING:
+			value = self.set(key, func())
+		return value
+
+	def pop(self, key, default=None):
+		with self._lock:
+			item = self._data.pop(key, _MISSING)
+		return default if item is _MISSING else item[0]
+
+	def discard(self, predicate):
+		"""Retire les entrées dont la clé vérifie predicate(key)"""
+		with self._lock:
+			for key in [key for key in self._data if predicate(key)]:
+				del self._data[key]
+
+	def clear(self):
+		with self._lock:
+			self._data.clear()
+
+	def stats(self):
+		total = self.hits + self.misses
+		return {
+			'hits': self.hits,
+			'misses': self.misses,
+			'size': len(self._data),
+			'maxsize': self.maxsize,
+			'hit_ratio': self.hits / total if total else 0.0,
+		}
+
+	@classmethod
+	def all_stats(cls):
+		return {name: cache.stats() for name, cache in cls.registry.items()}
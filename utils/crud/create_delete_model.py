@@ -1,11 +1,13 @@
 from typing import Callable
 
 import streamlit as st
-from sqlalchemy import select
+from sqlalchemy import delete, select
 from sqlalchemy.orm import DeclarativeBase
 from streamlit import session_state as ss
 from streamlit.connections.sql_connection import SQLConnection
 
+from database.base import Base
+from utils.cache import Generations
 from utils.crud.filters import ExistingData
 from utils.crud.input_fields import InputFields
 from utils.crud.lib import get_pretty_name, log, set_state
@@ -19,6 +21,7 @@ class CreateRow:
         base_key: str = "create",
         create_show_many: bool = False,
         callback: Callable | None = None,
+        fk_search_limit: int | None = None,
     ) -> None:
         self.conn = conn
         self.Model = Model
@@ -31,7 +34,9 @@ class CreateRow:
         set_state("stsql_updated", 0)
 
         with conn.session as s:
-            self.existing_data = ExistingData(s, Model, self.default_values)
+            self.existing_data = ExistingData(
+                s, Model, self.default_values, search_limit=fk_search_limit, conn=conn
+            )
             self.input_fields = InputFields(
                 Model, base_key, self.default_values, self.existing_data
             )
@@ -55,6 +60,7 @@ class CreateRow:
 
     def show(self, pretty_name: str):
         st.subheader(pretty_name)
+        self.input_fields.input_fk_searches()
 
         with st.form(f"create_model_form_{pretty_name}_{self.base_key}", border=False):
             created = self.get_fields()
@@ -70,6 +76,7 @@ class CreateRow:
                 try:
                     s.add(row)
                     s.commit()
+                    Generations.bump(self.Model.__tablename__)
                     self.callback(row) if self.callback else None
                     ss.stsql_updated += 1
                     log("CREATE", self.Model.__tablename__, row)
@@ -101,6 +108,9 @@ class CreateRow:
 
 
 class DeleteRows:
+    # Taille des morceaux de DELETE ... WHERE id IN (...)
+    chunk_size = 500
+
     def __init__(
         self,
         conn: SQLConnection,
@@ -114,46 +124,120 @@ class DeleteRows:
         self.rows_id = rows_id
         self.base_key = base_key
         self.callback = callback
+        self.labels = None
 
-    def get_rows_str(_self, rows_id: list[int]):
-        id_col = _self.Model.__table__.columns.get("id")
-        assert id_col is not None
-        stmt = select(_self.Model).where(id_col.in_(rows_id))
+    def get_chunks(self, ids: list[int]):
+        for i in range(0, len(ids), self.chunk_size):
+            yield ids[i:i + self.chunk_size]
 
-        with _self.conn.session as s:
-            rows = s.execute(stmt).scalars()
-            rows_str = [str(row) for row in rows]
+    def get_labels(self, rows_id: list[int]) -> dict[int, str]:
+        """Libellés des lignes par id : __label__ du modèle, à défaut str() des objets"""
+        id_col = self.Model.__table__.columns.get("id")
+        assert id_col is not None
+        label_stmt = self.Model.__label__()
+        labels = {}
+
+        with self.conn.session as s:
+            for chunk in self.get_chunks(rows_id):
+                if label_stmt is not None:
+                    labels.update((idx, name) for idx, name in s.execute(label_stmt.where(id_col.in_(chunk))))
+                else:
+                    rows = s.execute(select(self.Model).where(id_col.in_(chunk))).scalars()
+                    labels.update((row.id, str(row)) for row in rows)
+
+        return labels
+
+    def get_returning_label(self):
+        """Colonne label de __label__ si elle ne lit que la table du modèle, seule visible de RETURNING"""
+        label_stmt = self.Model.__label__()
+        if label_stmt is None or label_stmt.get_final_froms() != [self.Model.__table__]:
+            return None
+        return list(label_stmt.selected_columns)[-1]
+
+    @staticmethod
+    def get_cascade_fks(table):
+        """Clés étrangères déclarées dans __deleted_with__ de leur modèle qui pointent vers table"""
+        return [
+            fk
+            for mapper in Base.registry.mappers
+            for colname in mapper.class_.__deleted_with__
+            for fk in mapper.class_.__table__.c[colname].foreign_keys
+            if fk.column.table is table
+        ]
+
+    def delete_dependents(self, s, table, ids, deleted: dict[str, int]):
+        """Supprime en une requête par table les lignes qui dépendent de ids, petits-enfants d'abord
+
+        Fait à la main plutôt que par ON DELETE CASCADE : SQLite ne l'applique qu'avec
+        PRAGMA foreign_keys=ON, et les bases existantes n'ont pas la contrainte.
+        """
+        for fk in self.get_cascade_fks(table):
+            dependent = fk.parent.table
+            self.delete_dependents(s, dependent, select(dependent.c.id).where(fk.parent.in_(ids)), deleted)
+            result = s.execute(delete(dependent).where(fk.parent.in_(ids)))
+            deleted[dependent.name] = deleted.get(dependent.name, 0) + result.rowcount
+
+    def delete_rows(self, s) -> tuple[dict[int, str], dict[str, int]]:
+        """DELETE par morceaux ; retourne les libellés des lignes réellement supprimées, par id
+
+        Avec RETURNING, le libellé vient de la requête quand il ne demande pas de jointure ;
+        sinon, celui lu à l'affichage. Sans RETURNING, les libellés sont lus juste avant le DELETE.
+        """
+        table = self.Model.__table__
+        returning = s.get_bind().dialect.delete_returning
+        label_col = self.get_returning_label() if returning else None
+        label_stmt = self.Model.__label__()
+        known = dict(self.labels or {})
+        deleted = {}
+        deleted_dependents = {}
+
+        for chunk in self.get_chunks(self.rows_id):
+            self.delete_dependents(s, table, chunk, deleted_dependents)
+            stmt = delete(table).where(table.c.id.in_(chunk))
+            if label_col is not None:
+                deleted.update((idx, name) for idx, name in s.execute(stmt.returning(table.c.id, label_col)))
+                continue
+            if returning:
+                ids = s.execute(stmt.returning(table.c.id)).scalars().all()
+            else:
+                if label_stmt is not None:
+                    known.update({idx: name for idx, name in s.execute(label_stmt.where(table.c.id.in_(chunk)))})
+                ids = s.execute(select(table.c.id).where(table.c.id.in_(chunk))).scalars().all()
+                s.execute(stmt)
+            deleted.update((idx, known.get(idx, str(idx))) for idx in ids)
 
-        return rows_str
+        return deleted, deleted_dependents
 
     def show(self, pretty_name):
         st.subheader("Supprimer les éléments ci-dessous ?")
 
-        rows_str = self.get_rows_str(self.rows_id)
+        if self.labels is None:
+            self.labels = self.get_labels(self.rows_id)
+        rows_str = [self.labels[row_id] for row_id in self.rows_id if row_id in self.labels]
         st.dataframe({pretty_name: rows_str}, hide_index=True)
 
+        dependents = sorted({fk.parent.table.name for fk in self.get_cascade_fks(self.Model.__table__)})
+        if dependents:
+            st.caption(f"Les lignes qui en dépendent seront aussi supprimées : {', '.join(dependents)}")
+
         btn = st.button("Supprimer", key=self.base_key)
         if btn:
-            id_col = self.Model.__table__.columns.get("id")
-            assert id_col is not None
-            lancs = []
             with self.conn.session as s:
                 try:
-                    for row_id in self.rows_id:
-                        lanc = s.get(self.Model, row_id)
-                        lancs.append(str(lanc))
-                        s.delete(lanc)
-
+                    deleted, deleted_dependents = self.delete_rows(s)
                     s.commit()
+                    Generations.bump(self.Model.__tablename__, *deleted_dependents)
                     ss.stsql_updated += 1
-                    qtty = len(self.rows_id)
-                    lancs_str = ", ".join(lancs)
+                    qtty = len(deleted)
+                    lancs_str = ", ".join(deleted.values())
                     log("DELETE", self.Model.__tablename__, lancs_str)
+                    for table_name, count in deleted_dependents.items():
+                        log("DELETE", table_name, f"{count} lignes dépendantes")
                     self.callback(self.rows_id) if self.callback else None
                     return True, f"{qtty} enregistrements supprimés avec succès"
                 except Exception as e:
                     ss.stsql_updated += 1
-                    log("DELETE", self.Model.__tablename__, "")
+                    log("DELETE", self.Model.__tablename__, "", success=False)
                     return False, str(e)
         else:
             return None, None
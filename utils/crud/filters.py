@@ -8,7 +8,16 @@ from sqlalchemy import distinct, func, select
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm.session import Session
 from sqlalchemy.sql.schema import ForeignKey
+from sqlalchemy.sql.util import find_tables
 from streamlit import session_state as ss
+from streamlit.connections.sql_connection import SQLConnection
+
+from modules.db import DB
+from utils.cache import Generations, TTLCache
+
+# Options des clés étrangères et bornes des dates, partagées par toutes les sessions du processus.
+# Clé : (type, tables lues, générations de ces tables, ...)
+existing_data_cache = TTLCache(maxsize=256, ttl=600, name="stsql_existing_data")
 
 
 @dataclass
@@ -17,6 +26,18 @@ class FkOpt:
 	name: str
 
 
+@Generations.subscribe
+def invalidate_existing_data(*tables):
+	"""Évince les options et bornes qui lisent une des tables écrites"""
+	written = set(tables)
+	existing_data_cache.discard(lambda key: not written.isdisjoint(key[1]))
+
+
+def get_existing_data_key(kind: str, tables, *parts):
+	tables = tuple(sorted(tables))
+	return kind, tables, Generations.get(*tables), *parts
+
+
 class ExistingData:
 	def __init__(
 			self,
@@ -24,16 +45,23 @@ class ExistingData:
 			Model: type[DeclarativeBase],
 			default_values: dict,
 			row: DeclarativeBase | None = None,
+			search_limit: int | None = None,
+			conn: SQLConnection | None = None,
 	) -> None:
 		self.session = session
 		self.Model = Model
 		self.default_values = default_values
 		self.row = row
+		self.search_limit = search_limit
+		self.conn = conn
 
 		self.cols = Model.__table__.columns
 		reg_values: Any = Model.registry._class_registry.values()
 		self._models = [reg for reg in reg_values if hasattr(reg, "__tablename__")]
 
+		# Clés étrangères en saisie assistée : options cherchées à la frappe (voir search_fk)
+		self.searchable_fk = set()
+
 		table_name = Model.__tablename__
 		self.dt = self.get_dt(table_name, ss.stsql_updated)
 		self.fk = self.get_fk(table_name, ss.stsql_updated)
@@ -52,17 +80,29 @@ class ExistingData:
 
 		return stmt
 
-	def _get_dt_col(self, column):
-		min_default = date.today() - relativedelta(days=30)
-		min_dt: date = self.session.query(func.min(column)).scalar() or min_default
-		max_dt: date = self.session.query(func.max(column)).scalar() or date.today()
-		return min_dt, max_dt
+	def get_default_key(self, model: type[DeclarativeBase]):
+		cols = model.__table__.columns
+		return tuple(sorted(
+			(colname, value) for colname, value in self.default_values.items() if colname in cols
+		))
+
+	def _get_dt_bounds(self, dt_cols):
+		"""min et max de toutes les colonnes de dates en une seule requête agrégée"""
+		stmt = select(*(agg(col) for col in dt_cols for agg in (func.min, func.max)))
+		return tuple(self.session.execute(stmt).one())
 
 	def get_dt(_self, table_name: str, updated: int) -> dict[str, tuple[date, date]]:
+		dt_cols = [col for col in _self.cols if col.type.python_type is date]
+		if not dt_cols:
+			return {}
+
+		key = get_existing_data_key("dt", (table_name,))
+		bounds = existing_data_cache.get_or_set(key, lambda: _self._get_dt_bounds(dt_cols))
+
+		min_default = date.today() - relativedelta(days=30)
 		opts = {
-			col.name: _self._get_dt_col(col)
-			for col in _self.cols
-			if col.type.python_type is date
+			col.name: (bounds[2 * i] or min_default, bounds[2 * i + 1] or date.today())
+			for i, col in enumerate(dt_cols)
 		}
 		return opts
 
@@ -71,12 +111,26 @@ class ExistingData:
 		fk_opt = FkOpt(idx, str(row))
 		return fk_opt
 
-	def get_foreign_opts(self, col, foreign_key: ForeignKey):
+	def get_foreign_model(self, foreign_key: ForeignKey) -> type[DeclarativeBase]:
 		foreign_table_name = foreign_key.column.table.name
-		model = next(
+		return next(
 			reg for reg in self._models if reg.__tablename__ == foreign_table_name
 		)
+
+	def get_foreign_opts(self, col, foreign_key: ForeignKey):
+		model = self.get_foreign_model(foreign_key)
 		fk_pk_name = foreign_key.column.description
+		label_stmt = model.__label__()
+		if label_stmt is not None and self.search_limit:
+			# Rien de plus que la valeur actuelle : le reste est cherché à la frappe
+			self.searchable_fk.add(col.description)
+			return self.get_current_opts(col, foreign_key, label_stmt, [])
+		if label_stmt is not None:
+			tables = {table.name for table in find_tables(label_stmt)}
+			key = get_existing_data_key("fk", tables, model.__tablename__, self.get_default_key(model))
+			opts = existing_data_cache.get_or_set(key, lambda: self.get_label_opts(model, label_stmt))
+			return self.get_current_opts(col, foreign_key, label_stmt, opts)
+
 		stmt = select(model).distinct()
 
 		stmt = self.add_default_where(stmt, model)
@@ -93,6 +147,48 @@ class ExistingData:
 
 		return opts
 
+	def get_label_opts(self, model: type[DeclarativeBase], label_stmt):
+		"""Options (id, libellé) lues en une requête, sans charger d'objets ni leurs relations"""
+		stmt = self.add_default_where(label_stmt, model).order_by(label_stmt.selected_columns.label)
+		return [FkOpt(idx, name) for idx, name in self.session.execute(stmt)]
+
+	def get_current_opts(self, col, foreign_key: ForeignKey, label_stmt, opts: list[FkOpt]):
+		"""Ajoute aux options la valeur actuelle de la ligne si elle n'y est pas"""
+		value = getattr(self.row, col.name) if self.row is not None else None
+		if value is not None and all(opt.idx != value for opt in opts):
+			stmt = label_stmt.where(foreign_key.column == value)
+			opts = opts + [FkOpt(idx, name) for idx, name in self.session.execute(stmt)]
+
+		return opts
+
+	def search_fk(self, col_name: str, search: str = ""):
+		"""Les search_limit premiers libellés qui commencent par search, plus la valeur actuelle
+
+		Le préfixe est cherché sur __label_search__ du modèle étranger (un index sur lower(...)),
+		à défaut sur le libellé entier.
+		"""
+		foreign_key = next(iter(self.cols[col_name].foreign_keys))
+		model = self.get_foreign_model(foreign_key)
+		label_stmt = model.__label__()
+		key = model.__label_search__()
+		if key is None:
+			key = func.lower(label_stmt.selected_columns.label)
+
+		stmt = self.add_default_where(label_stmt, model)
+		prefix = search.strip()
+
+		# Appelé à chaque frappe, après la fermeture de la session du constructeur
+		with DB.read_session(self.conn) as s:
+			if prefix:
+				# Même lower() que la clé : celui de SQLite ne replie que l'ASCII (« É » reste « É »)
+				prefix = s.scalar(select(func.lower(prefix)))
+				upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+				stmt = stmt.where(key >= prefix, key < upper)
+			stmt = stmt.order_by(key, label_stmt.selected_columns.id).limit(self.search_limit)
+			opts = [FkOpt(idx, name) for idx, name in s.execute(stmt)]
+
+		return opts + [opt for opt in self.fk[col_name] if opt not in opts]
+
 	def get_fk(_self, table_name: str, _updated: int):
 		fk_cols = [col for col in _self.cols if len(list(col.foreign_keys)) > 0]
 		opts = {
@@ -9,6 +9,8 @@ from sqlalchemy import inspect
 from streamlit.connections import SQLConnection
 
 from database.base import Base
+from modules.db import DB
+from utils.cache import Generations
 
 
 class DynamicImportExport:
@@ -122,21 +124,34 @@ class DynamicImportExport:
 
 		return {"errors": errors, "warnings": warnings}
 
+	def preview_imported_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
+		"""Données du fichier après process_imported_dataframe, dont les écritures sont annulées"""
+		if not self.process_imported_dataframe:
+			return df
+		with DB.transaction(dry_run=True):
+			return self.process_imported_dataframe(df)
+
 	def import_table_data(self, df: pd.DataFrame,
 	                      mode: str = "insert") -> Dict[str, Any]:
 		"""
 		Importe les données dans une table
 
+		process_imported_dataframe et l'insertion partagent une transaction : en cas d'échec,
+		rien de ce qu'ils ont écrit n'est conservé.
+
 		Args:
-			df: DataFrame contenant les données
+			df: DataFrame contenant les données du fichier
 			mode: "insert", "update", "upsert" ou "replace"
 		"""
 		table_name = self.model.__tablename__
-		with self.connection.session as session:
-			try:
+		try:
+			with DB.transaction() as session:
 				if not self.model:
 					raise ValueError(f"Modèle pour la table '{table_name}' non trouvé")
 
+				if self.process_imported_dataframe:
+					df = self.process_imported_dataframe(df)
+
 				columns_info = self.get_model_columns(self.model)
 
 				# Filtrer les colonnes connues
@@ -231,8 +246,9 @@ class DynamicImportExport:
 						errors.append(f"Ligne {index}: {str(e)}")
 						continue
 
-				# Commit des changements
-				session.commit()
+				# Commit des changements (flush seulement : la transaction valide à la sortie)
+				DB.commit(session)
+				DB.on_commit(lambda: Generations.bump(table_name))
 
 				return {
 					"success": True,
@@ -241,15 +257,14 @@ class DynamicImportExport:
 					"errors": errors
 				}
 
-			except Exception as e:
-				session.rollback()
-				self.logger.error(f"Erreur lors de l'import dans {table_name}: {str(e)}")
-				return {
-					"success": False,
-					"success_count": 0,
-					"error_count": len(df),
-					"errors": [str(e)]
-				}
+		except Exception as e:
+			self.logger.error(f"Erreur lors de l'import dans {table_name}: {str(e)}")
+			return {
+				"success": False,
+				"success_count": 0,
+				"error_count": len(df),
+				"errors": [str(e)]
+			}
 
 
 def render_export(key_prefix: str, table_name: str, pretty_table_name: str, import_export_manager: DynamicImportExport):
@@ -341,8 +356,9 @@ def render_import(key_prefix: str, table_name: str, pretty_table_name: str, impo
 			else:
 				df = pd.read_excel(uploaded_file)
 
-			if import_export_manager.process_imported_dataframe:
-				df = import_export_manager.process_imported_dataframe(df)
+			# Aperçu seulement : le traitement est refait dans la transaction de l'import
+			data = df
+			df = import_export_manager.preview_imported_dataframe(data)
 
 			st.success(f"✅ Fichier lu: {len(df)} lignes, {len(df.columns)} colonnes")
 
@@ -405,7 +421,7 @@ def render_import(key_prefix: str, table_name: str, pretty_table_name: str, impo
 						key=f"{key_prefix}_import_btn_{table_name}"
 				):
 					with st.spinner("Import en cours..."):
-						result = import_export_manager.import_table_data(df, import_mode)
+						result = import_export_manager.import_table_data(data, import_mode)
 
 						if result["success"]:
 							st.success(f"✅ Import réussi! {result['success_count']} enregistrements traités")
@@ -6,6 +6,7 @@ from sqlalchemy import Numeric
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.sql.elements import KeyedColumnElement
 from sqlalchemy.types import Enum as SQLEnum
+from streamlit import session_state as ss
 
 from utils.crud.filters import ExistingData
 
@@ -23,9 +24,27 @@ class InputFields:
 		self.default_values = default_values
 		self.existing_data = existing_data
 
+	def input_fk_searches(self):
+		"""Champs de recherche des clés étrangères en saisie assistée
+
+		Affichés avant le formulaire : dans un st.form, la saisie ne relancerait pas la recherche.
+		"""
+		for col in self.Model.__table__.columns:
+			col_name = col.description
+			if col_name in self.existing_data.searchable_fk and not self.default_values.get(col_name):
+				st.text_input(
+					f"Rechercher : {col.info.get('label')}",
+					key=f"{self.key_prefix}_{col_name}_search",
+					placeholder="Début du libellé",
+				)
+
 	def input_fk(self, col_name: str, label, value: int | None):
 		key = f"{self.key_prefix}_{col_name}"
-		opts = self.existing_data.fk[col_name]
+		if col_name in self.existing_data.searchable_fk:
+			search = ss.get(f"{key}_search", "")
+			opts = self.existing_data.search_fk(col_name, search)
+		else:
+			opts = self.existing_data.fk[col_name]
 
 		index = next((i for i, opt in enumerate(opts) if opt.idx == value), None)
 		input_value = st.selectbox(
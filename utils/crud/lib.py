@@ -1,6 +1,8 @@
+import re
 import sys
 from typing import Literal
 
+import pandas as pd
 import streamlit as st
 from loguru import logger
 from streamlit import session_state as ss
@@ -40,6 +42,88 @@ def get_pretty_name(name: str):
     return pretty_name
 
 
+# Directives strftime traduites en jetons momentJS (formats de st.column_config.DateColumn)
+MOMENT_TOKENS = {
+    "%d": "DD",
+    "%m": "MM",
+    "%Y": "YYYY",
+    "%y": "YY",
+    "%H": "HH",
+    "%M": "mm",
+    "%S": "ss",
+    "%B": "MMMM",
+    "%b": "MMM",
+    "%A": "dddd",
+    "%a": "ddd",
+}
+
+
+def strftime_to_moment(fmt: str):
+    directives = re.findall(r"%.", fmt)
+    if any(directive not in MOMENT_TOKENS for directive in directives):
+        return None
+    parts = re.split(r"(%.)", fmt)
+    return "".join(MOMENT_TOKENS.get(part) or (f"[{part}]" if part else "") for part in parts)
+
+
+def get_column_format(fmt: str, serie: pd.Series):
+    """Traduit un format de str.format ("{:,.2f}", "{:%d/%m/%Y}") en colonne de st.column_config
+
+    Retourne None si le format n'a pas d'équivalent : il reste alors appliqué par pandas Styler.
+    """
+    match = re.fullmatch(r"(?P<prefix>[^{}]*)\{:(?P<spec>[^{}]*)\}(?P<suffix>[^{}]*)", fmt)
+    if not match:
+        return None
+    prefix, spec, suffix = match["prefix"], match["spec"], match["suffix"]
+
+    if spec.startswith("%"):
+        moment = strftime_to_moment(prefix + spec + suffix)
+        if moment is None:
+            return None
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            return st.column_config.DatetimeColumn(format=moment)
+        return st.column_config.DateColumn(format=moment)
+
+    number = re.fullmatch(r"(?P<comma>,?)(?:\.(?P<precision>\d+))?(?P<kind>[fd]?)", spec)
+    if not number or not (number["precision"] or number["kind"] or number["comma"]):
+        return None
+    precision = int(number["precision"]) if number["precision"] else None
+    if number["kind"] == "d":
+        precision = 0
+    elif number["kind"] == "f" and precision is None:
+        # Précision par défaut de str.format
+        precision = 6
+
+    if precision is None:
+        # Séparateur de milliers sans précision : seul le format "localized" le propose
+        if prefix or suffix:
+            return None
+        return st.column_config.NumberColumn(format="localized")
+
+    # printf explicite : le nombre de décimales est garanti ; le printf de Streamlit (sprintf-js)
+    # n'a pas de séparateur de milliers, que "{:,.2f}" perd donc
+    printf = "%d" if precision == 0 else f"%.{precision}f"
+    return st.column_config.NumberColumn(
+        format=f"{prefix.replace('%', '%%')}{printf}{suffix.replace('%', '%%')}"
+    )
+
+
+def get_column_config(formatter: dict, df: pd.DataFrame):
+    """Sépare les formats traduisibles en st.column_config de ceux qui nécessitent pandas Styler"""
+    column_config = {}
+    styler_formatter = {}
+    for colname, fmt in formatter.items():
+        column = None
+        if isinstance(fmt, str) and colname in df.columns:
+            column = get_column_format(fmt, df[colname])
+        if column is None:
+            styler_formatter[colname] = fmt
+        else:
+            column_config[colname] = column
+
+    return column_config, styler_formatter
+
+
 if __name__ == "__main__":
     set_logging(False)
     log(action="CREATE", table="tableA", row="rowabc")
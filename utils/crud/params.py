@@ -1,4 +1,7 @@
-from datetime import date
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
 
 import streamlit as st
 from sqlalchemy.sql.elements import KeyedColumnElement
@@ -6,6 +9,10 @@ from streamlit import session_state as ss
 
 from utils.crud.filters import FkOpt
 
+# Valeur d'URL du choix « vide » des filtres à choix multiples (IS NULL)
+NULL_PARAM = "__null__"
+NULL_LABEL = "(vide)"
+
 
 def get_dt_param(colname: str):
     start_param = st.query_params.get(f"{colname}_start", None)
@@ -23,28 +30,70 @@ def get_dt_param(colname: str):
     return start, end
 
 
-def get_no_dt_param(col: KeyedColumnElement, existing: list):
-    colname = col.description
-    if not colname:
+def decode_filter_value(value: str | None, col: KeyedColumnElement):
+    """Valeur typée d'un filtre lue en texte (paramètre d'URL ou valeur castée en SQL)"""
+    if value is None:
         return None
 
-    param = st.query_params.get(colname, None)
-    if not param:
+    enum_class = getattr(col.type, "enum_class", None)
+    if enum_class is not None:
+        return enum_class[value] if value in enum_class.__members__ else None
+
+    python_type = col.type.python_type
+    if python_type is bool:
+        return value in ("1", "True", "true")
+    if python_type is str:
+        return value
+    try:
+        return python_type(value)
+    except (ValueError, TypeError):
         return None
 
-    if col.type.python_type is str:
-        return existing.index(param)
 
-    if col.type.python_type is not int:
-        return None
+def get_no_dt_values(col: KeyedColumnElement):
+    """Valeurs choisies d'un filtre à choix multiples (paramètre d'URL répété)"""
+    colname = col.description
+    if not colname:
+        return []
+
+    values = []
+    for param in st.query_params.get_all(colname):
+        if param == NULL_PARAM:
+            values.append(None)
+            continue
+        value = decode_filter_value(param, col) if param else None
+        if value is not None:
+            values.append(value)
+    return values
 
-    try:
-        idx = int(param)
-    except ValueError:
-        return None
 
-    index = next((i for i, fk in enumerate(existing) if fk.idx == idx), None)
-    return index
+def get_no_dt_param(col: KeyedColumnElement, existing: list):
+    values = get_no_dt_values(col)
+    return [option for option in existing if getattr(option, "idx", option) in values]
+
+
+def get_search_param(colname: str):
+    return st.query_params.get(f"{colname}_search", None) or None
+
+
+def set_search_param(colname: str, key: str):
+    value = ss[key]
+    if value:
+        st.query_params[f"{colname}_search"] = value
+    else:
+        st.query_params.pop(f"{colname}_search", None)
+
+
+def get_fulltext_param(base_key: str):
+    return st.query_params.get(f"{base_key}_fulltext", None) or None
+
+
+def set_fulltext_param(base_key: str, key: str):
+    value = ss[key]
+    if value:
+        st.query_params[f"{base_key}_fulltext"] = value
+    else:
+        st.query_params.pop(f"{base_key}_fulltext", None)
 
 
 def set_dt_param(colname: str, key: str, suffix: str):
@@ -55,10 +104,92 @@ def set_dt_param(colname: str, key: str, suffix: str):
     st.query_params[query_key] = value_str
 
 
+def encode_filter_value(value):
+    if value is None:
+        return NULL_PARAM
+    if isinstance(value, FkOpt):
+        return str(value.idx)
+    if isinstance(value, Enum):
+        return value.name
+    return str(value)
+
+
+def format_filter_value(value):
+    return NULL_LABEL if value is None else str(value)
+
+
 def set_no_dt_param(colname: str, key: str):
     value = ss[key]
-    if isinstance(value, str):
-        st.query_params[colname] = value
-    elif isinstance(value, FkOpt):
-        value_str = str(value.idx)
-        st.query_params[colname] = value_str
+    values = value if isinstance(value, list) else [value]
+    values = [encode_filter_value(value) for value in values]
+    if values:
+        st.query_params[colname] = values
+    else:
+        st.query_params.pop(colname, None)
+
+
+def encode_key_value(value):
+    if value is None:
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def decode_key_value(value, python_type: type):
+    if value is None:
+        return None
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value[:10])
+    return python_type(value)
+
+
+def get_cursor_param(key: str, cols: list[KeyedColumnElement]):
+    """Curseur de pagination par clé : (page, lignes par page, clé de la dernière ligne)"""
+    param = st.query_params.get(key, None)
+    if not param:
+        return None
+
+    try:
+        cursor = json.loads(param)
+        after = tuple(
+            decode_key_value(value, col.type.python_type)
+            for value, col in zip(cursor["after"], cols, strict=True)
+        )
+        return int(cursor["page"]), int(cursor["limit"]), after
+    except (ValueError, TypeError, KeyError, NotImplementedError):
+        return None
+
+
+def set_cursor_param(key: str, page: int, limit: int, after: tuple):
+    cursor = {
+        "page": page,
+        "limit": limit,
+        "after": [encode_key_value(value) for value in after],
+    }
+    st.query_params[key] = json.dumps(cursor, separators=(",", ":"))
+
+
+def get_sort_param(base_key: str):
+    """Colonne et sens du tri côté serveur : (nom de colonne ou None, décroissant)"""
+    colname = st.query_params.get(f"{base_key}_sort", None) or None
+    descending = st.query_params.get(f"{base_key}_sort_dir", "asc") == "desc"
+    return colname, descending
+
+
+def set_sort_param(base_key: str, key: str):
+    value = ss[key]
+    if value:
+        st.query_params[f"{base_key}_sort"] = value
+    else:
+        st.query_params.pop(f"{base_key}_sort", None)
+
+
+def set_sort_dir_param(base_key: str, key: str):
+    st.query_params[f"{base_key}_sort_dir"] = "desc" if ss[key] else "asc"
@@ -1,26 +1,60 @@
+import threading
+from bisect import bisect_left, bisect_right
 from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 from typing import Any
 
 import pandas as pd
 import streamlit as st
 import streamlit_antd_components as sac
-from sqlalchemy import CTE, Select, distinct, func, select
+from sqlalchemy import CTE, Select, String, Subquery, Table, cast, distinct, func, literal, or_, select, tuple_, union_all
+from sqlalchemy.exc import CompileError, SQLAlchemyError
 from sqlalchemy.orm import Session
-from sqlalchemy.sql.elements import KeyedColumnElement
+from sqlalchemy.sql import visitors
+from sqlalchemy.sql.elements import KeyedColumnElement, Label, Over
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.sql.util import find_tables
 from sqlalchemy.types import Enum as SQLEnum
-from streamlit.connections.sql_connection import SQLConnection
 from streamlit.delta_generator import DeltaGenerator
 
+from utils.cache import Generations, TTLCache
 from utils.crud import (params)
 from utils.crud.lib import get_pretty_name
 
-hash_funcs: dict[Any, Callable[[Any], Any]] = {
-    pd.Series: lambda serie: serie.to_dict(),
-    CTE: lambda sel: (str(sel), sel.compile().params),
-    Select: lambda sel: (str(sel), sel.compile().params),
-    "streamlit_sql.read_cte.ColFilter": lambda cl: (cl.dt_filters, cl.no_dt_filters),
-}
+# Une borne de page sur KEYSET_INDEX_STRIDE est retenue dans l'index des pages
+KEYSET_INDEX_STRIDE = 10
+
+page_boundaries_cache = TTLCache(maxsize=256, ttl=600, name="stsql_page_boundaries")
+count_cache = TTLCache(maxsize=512, ttl=600, name="stsql_count")
+# Dernier comptage exact de chaque requête, toutes générations confondues : sert d'estimation
+last_counts = TTLCache(maxsize=512, ttl=3600, name="stsql_last_counts")
+count_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="stsql_count")
+_pending_counts: dict = {}
+_pending_lock = threading.Lock()
+
+# Pages voisines lues d'avance, dans un cache propre à chaque session
+PREFETCH_CACHE_SIZE = 8
+prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="stsql_prefetch")
+_pending_pages: dict = {}
+
+# Colonne technique portant le solde cumulé calculé en SQL
+BALANCE_COLUMN = "stsql_balance"
+
+# Colonne technique portant le nombre total de lignes dans la requête de la page
+TOTAL_COLUMN = "stsql_total"
+
+# Colonne technique portant la pertinence d'une ligne pour la recherche plein texte
+RANK_COLUMN = "stsql_rank"
+
+# Fonctions d'agrégat qui empêchent de pousser les filtres dans le select d'origine
+AGGREGATE_FUNCTIONS = {"count", "sum", "min", "max", "avg", "total", "group_concat", "string_agg", "array_agg"}
+
+# Au-delà de ce nombre de valeurs distinctes, un filtre de recherche remplace la liste de choix
+FILTER_VALUES_THRESHOLD = 500
+
+existing_values_cache = TTLCache(maxsize=256, ttl=600, name="stsql_existing_values")
+balance_checkpoints_cache = TTLCache(maxsize=64, ttl=600, name="stsql_balance_checkpoints")
 
 
 def get_existing_cond(col: KeyedColumnElement):
@@ -33,39 +67,60 @@ def get_existing_cond(col: KeyedColumnElement):
     has_fk = len(fks) > 0
     int_not_fk_cond = col.type.python_type is int and not has_fk
 
-    cond = is_not_pk and (is_str or is_bool or int_not_fk_cond, is_enum)
+    cond = is_not_pk and (is_str or is_bool or int_not_fk_cond or is_enum)
     return cond
 
 
 def get_existing_values(
     _session: Session,
     cte: CTE,
-    updated: int,
     available_col_filter: list[str] | None = None,
+    threshold: int = FILTER_VALUES_THRESHOLD,
 ):
-    if not available_col_filter:
-        available_col_filter = []
+    """Valeurs distinctes des colonnes filtrables, en une seule requête UNION ALL
+
+    Au plus threshold + 1 valeurs sont lues par colonne ; au-delà, la colonne reçoit None
+    et sera filtrée par une recherche plutôt que par une liste de choix.
+    """
+    available_col_filter = available_col_filter or []
+    cols = [
+        col
+        for col in cte.columns
+        if col.description in available_col_filter and get_existing_cond(col)
+    ]
+    if not cols:
+        return {}
+
+    parts = []
+    for index, col in enumerate(cols):
+        sub = select(distinct(col).label("value")).order_by(col).limit(threshold + 1).subquery()
+        parts.append(select(literal(index).label("col_index"), cast(sub.c.value, String).label("value")))
+    stmt = union_all(*parts)
+
+    key = get_cache_key(stmt, _session.get_bind())
+
+    def compute():
+        values: list[list] = [[] for _ in cols]
+        for col_index, value in _session.execute(stmt):
+            values[col_index].append(params.decode_filter_value(value, cols[col_index]))
 
-    cols = list(cte.columns)
-
-    if len(available_col_filter) > 0:
-        cols = [col for col in cte.columns if get_existing_cond(col)]
-
-    result: dict[str, Any] = {}
-    for col in cols:
-        stmt = select(distinct(col)).order_by(col).limit(10000)
-        values = _session.execute(stmt).scalars().all()
-        colname = col.description
-        assert colname is not None
-        result[colname] = values
+        result: dict[str, Any] = {}
+        for col, col_values in zip(cols, values):
+            if len(col_values) > threshold:
+                result[col.description] = None
+            else:
+                result[col.description] = col_values
+        return result
 
-    return result
+    return existing_values_cache.get_or_set(key, compute)
 
 
 class ColFilter:
+    """Filtres de colonnes : widgets si container est ouvert, sinon lus dans les paramètres d'URL"""
+
     def __init__(
         self,
-        container: DeltaGenerator,
+        container: DeltaGenerator | None,
         cte: CTE,
         existing_values: dict[str, Any],
         available_col_filter: list[str] | None = None,
@@ -78,7 +133,10 @@ class ColFilter:
         self.base_key = base_key
 
         self.dt_filters = self.get_dt_filters()
+        self.search_filters: dict[str, str | None] = {}
         self.no_dt_filters = self.get_no_dt_filters()
+        # Sous-requête (id, rank) de la recherche plein texte, renseignée par SqlUi.search
+        self.fulltext: Subquery | None = None
 
     def __str__(self):
         dt_str = ", ".join(
@@ -88,15 +146,14 @@ class ColFilter:
             if v
             if dt
         )
-        no_dt_str = ", ".join(f"{k}: {v}" for k, v in self.no_dt_filters.items() if v)
-
-        filter_str = ""
-        if dt_str != "":
-            filter_str += f"{dt_str}, "
-        if no_dt_str != "":
-            filter_str += f"{no_dt_str}"
+        no_dt_str = ", ".join(
+            f"{k}: {' | '.join(params.format_filter_value(value) for value in v)}"
+            for k, v in self.no_dt_filters.items()
+            if v
+        )
+        search_str = ", ".join(f"{k} ~ {v}" for k, v in self.search_filters.items() if v)
 
-        return filter_str
+        return ", ".join(part for part in (dt_str, no_dt_str, search_str) if part)
 
     def get_dt_filters(self):
         cols = [
@@ -110,6 +167,15 @@ class ColFilter:
         for col in cols:
             colname = col.description
             assert colname is not None
+
+            if self.container is None:
+                default_start, default_end = params.get_dt_param(colname)
+                result[colname] = (
+                    date.fromisoformat(default_start) if default_start else None,
+                    date.fromisoformat(default_end) if default_end else None,
+                )
+                continue
+
             label = get_pretty_name(colname)
             self.container.write(label)
             start_c, end_c, btn_c = self.container.columns(
@@ -168,6 +234,7 @@ class ColFilter:
             for col in self.cte.columns
             if col.description in self.available_col_filter
             and col.type.python_type is not date
+            and get_existing_cond(col)
         ]
 
         result: dict[str, Any] = {}
@@ -175,69 +242,410 @@ class ColFilter:
             colname = col.description
             assert colname is not None
 
-            existing_value = self.existing_values.get(colname)
+            if self.container is None:
+                result[colname] = params.get_no_dt_values(col)
+                self.search_filters[colname] = params.get_search_param(colname)
+                continue
 
-            if existing_value is None:
-                return result
+            if colname not in self.existing_values:
+                continue
 
             label = get_pretty_name(colname)
-            key = f"{self.base_key}_no_dt_filter_{label}"
-            index = params.get_no_dt_param(col, existing_value)
             col1, col2 = self.container.columns(
                 [0.95, 0.05], vertical_alignment="bottom"
             )
-            value = col1.selectbox(
-                label,
-                options=self.existing_values[colname],
-                index=index,
-                key=key,
-                args=(colname, key),
-                on_change=params.set_no_dt_param,
-            )
+
+            existing_value = self.existing_values[colname]
+            if existing_value is None:
+                # Trop de valeurs distinctes pour une liste : recherche par contenu
+                key = f"{self.base_key}_search_filter_{label}"
+                value = col1.text_input(
+                    label,
+                    value=params.get_search_param(colname) or "",
+                    placeholder="Rechercher..." if col.type.python_type is str else "Valeur ou min..max",
+                    key=key,
+                    args=(colname, key),
+                    on_change=params.set_search_param,
+                )
+                self.search_filters[colname] = value or None
+            else:
+                key = f"{self.base_key}_no_dt_filter_{label}"
+                value = col1.multiselect(
+                    label,
+                    options=existing_value,
+                    default=params.get_no_dt_param(col, existing_value),
+                    format_func=params.format_filter_value,
+                    key=key,
+                    args=(colname, key),
+                    on_change=params.set_no_dt_param,
+                )
+                result[colname] = value
+
             btn = col2.button(label="", icon=":material/cancel:", key=f"{key}_btn")
             if btn:
                 st.query_params.pop(colname, None)
+                st.query_params.pop(f"{colname}_search", None)
                 st.rerun()
 
-            result[colname] = value
-
         return result
 
 
-def get_stmt_no_pag_dt(cte: CTE, no_dt_filters: dict[str, str | None]):
-    stmt = select(cte)
-    for colname, value in no_dt_filters.items():
-        if value:
-            col = cte.columns.get(colname)
-            assert col is not None
-            stmt = stmt.where(col == value)
+def can_push_down(stmt: Select):
+    """Les filtres peuvent-ils porter sur le select d'origine ? Pas avec agrégat, DISTINCT, LIMIT ou fenêtre"""
+    if (
+        stmt._group_by_clauses
+        or stmt._having_criteria
+        or stmt._distinct
+        or stmt._limit_clause is not None
+        or stmt._offset_clause is not None
+    ):
+        return False
+
+    colsname = [col.key for col in stmt.selected_columns]
+    if len(set(colsname)) != len(colsname):
+        return False
+
+    for col in stmt.selected_columns:
+        for element in visitors.iterate(col):
+            if isinstance(element, Over):
+                return False
+            if isinstance(element, FunctionElement) and element.name.lower() in AGGREGATE_FUNCTIONS:
+                return False
+    return True
+
+
+def get_read_source(read_instance, cte: CTE):
+    """Requête de départ des lectures : le select d'origine quand les filtres peuvent y être poussés
+
+    Les conditions portent alors sur les colonnes des tables (et leurs index) plutôt que sur
+    celles d'un CTE, que MySQL ou SQLite peuvent matérialiser. Sinon, le CTE est conservé.
+    """
+    if isinstance(read_instance, CTE):
+        return cte
+    stmt = read_instance if isinstance(read_instance, Select) else select(read_instance)
+    if not can_push_down(stmt):
+        return cte
+    if any(stmt.selected_columns.get(col.description) is None for col in cte.columns):
+        return cte
+    # L'ordre est fixé par la pagination
+    return stmt.order_by(None)
+
+
+def get_filter_col(stmt: Select, colname: str):
+    """Expression à filtrer : celle d'origine pour une colonne nommée par un label"""
+    col = stmt.selected_columns.get(colname)
+    assert col is not None
+    return col.element if isinstance(col, Label) else col
+
+
+def get_range_condition(col, start, end):
+    if start is not None and end is not None:
+        return col.between(start, end)
+    if start is not None:
+        return col >= start
+    if end is not None:
+        return col <= end
+    return None
+
+
+def get_value_condition(col, value):
+    """Égalité pour une valeur, IN pour plusieurs ; None dans une liste choisit les lignes IS NULL"""
+    if not isinstance(value, (list, tuple, set)):
+        value = [] if value is None else [value]
+    values = [value for value in value if value is not None and value != ""]
+    conditions = []
+    if len(values) == 1:
+        conditions.append(col == values[0])
+    elif values:
+        conditions.append(col.in_(values))
+    if None in value:
+        conditions.append(col.is_(None))
+    if not conditions:
+        return None
+    return or_(*conditions)
+
+
+def get_search_condition(col, value: str):
+    """Contient pour le texte ; pour les autres types, valeur exacte ou intervalle min..max"""
+    if col.type.python_type is str:
+        return col.contains(value, autoescape=True)
+
+    start, sep, end = value.partition("..")
+    if not sep:
+        return col == params.decode_filter_value(value, col)
+    return get_range_condition(
+        col,
+        params.decode_filter_value(start.strip() or None, col),
+        params.decode_filter_value(end.strip() or None, col),
+    )
 
-    return stmt
 
+def apply_conditions(stmt: Select, conditions: list):
+    conditions = [condition for condition in conditions if condition is not None]
+    return stmt.where(*conditions) if conditions else stmt
 
-def get_stmt_no_pag(cte: CTE, col_filter: ColFilter):
-    no_dt_filters = col_filter.no_dt_filters
-    stmt = get_stmt_no_pag_dt(cte, no_dt_filters)
 
-    dt_filters = col_filter.dt_filters
-    for colname, filters in dt_filters.items():
-        col = cte.columns.get(colname)
-        assert col is not None
-        start, end = filters
-        if start:
-            stmt = stmt.where(col >= start)
-        if end:
-            stmt = stmt.where(col <= end)
+def get_stmt_no_pag_dt(
+    source: CTE | Select,
+    no_dt_filters: dict[str, Any],
+    search_filters: dict[str, str | None] | None = None,
+    fulltext: Subquery | None = None,
+):
+    stmt = source if isinstance(source, Select) else select(source)
+    if fulltext is not None:
+        # Seules les lignes trouvées restent, avec leur rang dans RANK_COLUMN
+        stmt = stmt.join(fulltext, fulltext.c.id == get_filter_col(stmt, "id")).add_columns(
+            fulltext.c.rank.label(RANK_COLUMN)
+        )
+
+    conditions = [
+        get_value_condition(get_filter_col(stmt, colname), value)
+        for colname, value in no_dt_filters.items()
+    ]
+    conditions += [
+        get_search_condition(get_filter_col(stmt, colname), value)
+        for colname, value in (search_filters or {}).items()
+        if value
+    ]
+    return apply_conditions(stmt, conditions)
+
+
+def apply_dt_filters(stmt: Select, dt_filters: dict[str, tuple[date | None, date | None]]):
+    conditions = [
+        get_range_condition(get_filter_col(stmt, colname), start or None, end or None)
+        for colname, (start, end) in dt_filters.items()
+    ]
+    return apply_conditions(stmt, conditions)
+
+
+def get_stmt_no_pag(source: CTE | Select, col_filter: ColFilter):
+    stmt = get_stmt_no_pag_dt(
+        source, col_filter.no_dt_filters, col_filter.search_filters, col_filter.fulltext
+    )
+    return apply_dt_filters(stmt, col_filter.dt_filters)
+
+
+def get_stmt_balance(
+    source: CTE | Select,
+    col_filter: ColFilter,
+    rolling_total_column: str,
+    orderby_colsname: list[str],
+    checkpoint: tuple[tuple, Any] | None = None,
+):
+    """Comme get_stmt_no_pag, avec le solde cumulé SUM() OVER (ORDER BY ... ROWS UNBOUNDED PRECEDING)
+
+    La fenêtre porte sur les lignes avant filtres de date, qui ne s'appliquent qu'ensuite : le
+    solde d'une ligne inclut les lignes antérieures à la période affichée. Avec un point de
+    contrôle (clé, solde à cette clé), seules les lignes après la clé sont sommées.
+    """
+    stmt = get_stmt_no_pag_dt(
+        source, col_filter.no_dt_filters, col_filter.search_filters, col_filter.fulltext
+    )
+    keyset_cols = get_keyset_cols(stmt, orderby_colsname)
+    balance = func.sum(stmt.selected_columns[rolling_total_column]).over(
+        order_by=keyset_cols, rows=(None, 0)
+    )
+    if checkpoint is not None:
+        key, base = checkpoint
+        stmt = stmt.where(tuple_(*keyset_cols) > tuple_(*key))
+        balance = balance + base
+
+    sub = stmt.add_columns(balance.label(BALANCE_COLUMN)).subquery()
+    return apply_dt_filters(select(sub), col_filter.dt_filters)
+
+
+def get_balance_checkpoints(
+    _session: Session,
+    stmt_no_pag_dt: Select,
+    keyset_colsname: list[str],
+    rolling_total_column: str,
+    every: int,
+):
+    """Solde cumulé toutes les every lignes : [(clé de la ligne, solde jusqu'à elle incluse), ...]"""
+    cache_key = get_cache_key(
+        stmt_no_pag_dt, _session.get_bind(), tuple(keyset_colsname), rolling_total_column, every
+    )
+
+    def compute():
+        sub = stmt_no_pag_dt.subquery()
+        cols = [sub.c[colname] for colname in keyset_colsname]
+        balance = func.sum(sub.c[rolling_total_column]).over(order_by=cols, rows=(None, 0))
+        row_number = func.row_number().over(order_by=cols)
+        numbered = select(*cols, balance.label("balance"), row_number.label("row_number")).subquery()
+        stmt = (
+            select(*(numbered.c[colname] for colname in keyset_colsname), numbered.c.balance)
+            .where(numbered.c.row_number % every == 0)
+            .order_by(numbered.c.row_number)
+        )
+        checkpoints = []
+        for row in _session.execute(stmt):
+            key = tuple(row[:-1])
+            if None not in key:
+                checkpoints.append((key, row[-1] or 0))
+        return checkpoints
+
+    return balance_checkpoints_cache.get_or_set(cache_key, compute)
+
+
+def get_balance_checkpoint(
+    _session: Session,
+    stmt_no_pag_dt: Select,
+    keyset_cols: list,
+    rolling_total_column: str,
+    every: int,
+    seek: tuple[tuple | None, bool, int],
+):
+    """Dernier point de contrôle situé avant la page ciblée par seek (voir get_keyset_seek)
+
+    Les clés sont comparées en Python : hors SQLite (collation binaire), seulement sans texte.
+    """
+    bound, inclusive, _ = seek
+    if bound is None or None in bound:
+        return None
+    is_sqlite = _session.get_bind().dialect.name == "sqlite"
+    if not is_sqlite and any(col.type.python_type is str for col in keyset_cols):
+        return None
+
+    keyset_colsname = [col.name for col in keyset_cols]
+    checkpoints = get_balance_checkpoints(
+        _session, stmt_no_pag_dt, keyset_colsname, rolling_total_column, every
+    )
+    keys = [key for key, _ in checkpoints]
+    index = (bisect_left if inclusive else bisect_right)(keys, bound) - 1
+    return checkpoints[index] if index >= 0 else None
+
+
+def get_stmt_key(stmt: Select, bind):
+    """Clé d'une requête : SQL compilé pour le dialecte, paramètres rendus en littéraux"""
+    try:
+        return str(stmt.compile(bind, compile_kwargs={"literal_binds": True}))
+    except (CompileError, NotImplementedError):
+        # Type sans rendu littéral : paramètres liés à part
+        compiled = stmt.compile(bind)
+        return f"{compiled} {sorted(compiled.params.items())!r}"
+
+
+def get_stmt_tables(stmt: Select):
+    return tuple(sorted({table.name for table in find_tables(stmt)}))
 
-    return stmt
 
+def get_generation(stmt: Select):
+    """Génération d'écriture des tables lues par la requête"""
+    return Generations.get(*get_stmt_tables(stmt))
 
-def get_qtty_rows(_conn: SQLConnection, stmt_no_pag: Select):
+
+def get_cache_key(stmt: Select, bind, *parts):
+    """Clé de mémoïsation d'une lecture : requête, options de l'appelant et génération des tables lues"""
+    return get_stmt_key(stmt, bind), *parts, get_generation(stmt)
+
+
+def count_rows(session: Session, stmt_no_pag: Select):
     stmt = select(func.count()).select_from(stmt_no_pag.subquery())
-    with _conn.session as s:
-        qtty = s.execute(stmt).scalar_one()
+    return session.execute(stmt).scalar_one()
+
+
+def set_qtty_rows(bind, stmt_no_pag: Select, qtty: int):
+    """Enregistre un comptage obtenu autrement (COUNT(*) OVER() de la page) dans le cache"""
+    stmt_key = get_stmt_key(stmt_no_pag, bind)
+    last_counts.set(stmt_key, qtty)
+    count_cache.set((stmt_key, get_generation(stmt_no_pag)), qtty)
+
+
+def get_qtty_rows(_session: Session, stmt_no_pag: Select):
+    stmt_key = get_stmt_key(stmt_no_pag, _session.get_bind())
+    key = (stmt_key, get_generation(stmt_no_pag))
+
+    def compute():
+        return last_counts.set(stmt_key, count_rows(_session, stmt_no_pag))
+
+    return count_cache.get_or_set(key, compute)
+
+
+def _count_in_background(engine, stmt_no_pag: Select, key: tuple, stmt_key: str):
+    try:
+        with Session(engine) as session:
+            qtty = count_rows(session, stmt_no_pag)
+        last_counts.set(stmt_key, qtty)
+        return count_cache.set(key, qtty)
+    finally:
+        with _pending_lock:
+            _pending_counts.pop(key, None)
+
+
+def get_qtty_rows_approx(engine, stmt_no_pag: Select):
+    """Nombre de lignes sans attendre le comptage : retourne (nombre, exact)
+
+    Hors cache, le comptage exact est lancé en arrière-plan et le dernier comptage connu de la
+    même requête sert d'estimation. Sans estimation disponible, on attend le comptage exact.
+    """
+    stmt_key = get_stmt_key(stmt_no_pag, engine)
+    key = (stmt_key, get_generation(stmt_no_pag))
+    qtty = count_cache.get(key)
+    if qtty is not None:
+        return qtty, True
+
+    with _pending_lock:
+        future = _pending_counts.get(key)
+        if future is None:
+            future = count_executor.submit(_count_in_background, engine, stmt_no_pag, key, stmt_key)
+            _pending_counts[key] = future
+
+    estimate = last_counts.get(stmt_key)
+    if estimate is None:
+        return future.result(), True
+    return estimate, False
+
+
+def is_count_ready(engine, stmt_no_pag: Select):
+    key = get_cache_key(stmt_no_pag, engine)
+    return key in count_cache
+
+
+def get_page_key(bind, stmt_no_pag: Select, options: tuple, limit: int, page: int):
+    """Clé d'une page : requête filtrée, options de lecture (tri, solde...), taille, numéro et génération"""
+    return get_cache_key(stmt_no_pag, bind, options, limit, page)
+
+
+def _prefetch_in_background(cache: TTLCache, key: tuple, fetch: Callable[[], pd.DataFrame]):
+    try:
+        return cache.set(key, fetch())
+    except SQLAlchemyError:
+        # La page sera lue normalement si on y navigue
+        return None
+    finally:
+        with _pending_lock:
+            _pending_pages.pop(key, None)
+
+
+def prefetch_page(cache: TTLCache, key: tuple, fetch: Callable[[], pd.DataFrame]):
+    """Lance la lecture d'une page en arrière-plan, sauf si elle est déjà en cache ou en cours"""
+    with _pending_lock:
+        if key in _pending_pages or key in cache:
+            return
+        _pending_pages[key] = prefetch_executor.submit(_prefetch_in_background, cache, key, fetch)
+
+
+def get_prefetched_page(cache: TTLCache, key: tuple):
+    """Page déjà lue, en attendant sa lecture si elle est en cours ; None sinon"""
+    df = cache.get(key)
+    if df is not None:
+        return df
+
+    with _pending_lock:
+        future = _pending_pages.get(key)
+    return future.result() if future is not None else None
+
+
+def get_pagination_state(opts_items_page: tuple[int, ...], base_key: str = ""):
+    """Lignes par page et page courante, lues dans l'état des widgets avant leur affichage"""
+    menu_cas = st.session_state.get(f"{base_key}_menu_cascader")
+    items_per_page = menu_cas[0] if menu_cas else opts_items_page[0]
+    page = st.session_state.get(f"{base_key}_pagination") or 1
+    return int(items_per_page), int(page)
+
 
-    return qtty
+def set_pagination_page(page: int, base_key: str = ""):
+    st.session_state[f"{base_key}_pagination"] = page
 
 
 def show_pagination(count: int, opts_items_page: tuple[int, ...], base_key: str = ""):
@@ -276,25 +684,129 @@ def get_stmt_pag(stmt_no_pag: Select, limit: int, page: int):
     return stmt
 
 
-# @st.cache_data(hash_funcs=hash_funcs)
-def initial_balance(
+def with_total(stmt_pag: Select):
+    """Ajoute COUNT(*) OVER() : le nombre total de lignes filtrées, calculé avant LIMIT/OFFSET"""
+    return stmt_pag.add_columns(func.count().over().label(TOTAL_COLUMN))
+
+
+def get_keyset_cols(stmt_no_pag: Select, orderby_colsname: list[str]):
+    """Colonnes de tri de la pagination par clé, complétées par id pour garantir l'unicité"""
+    colsname = list(orderby_colsname)
+    if "id" not in colsname:
+        colsname.append("id")
+    cols = [stmt_no_pag.selected_columns.get(colname) for colname in colsname]
+    return [col for col in cols if col is not None]
+
+
+def get_orderby(keyset_cols: list, descending: bool = False):
+    return [col.desc() if descending else col.asc() for col in keyset_cols]
+
+
+def get_indexed_colsnames(cte: CTE):
+    """Colonnes du CTE issues de la première colonne d'un index ou de la clé primaire d'une table"""
+    indexed = set()
+    for col in cte.columns:
+        for base_col in col.proxy_set:
+            table = getattr(base_col, "table", None)
+            if not isinstance(table, Table) or base_col.name not in table.c:
+                continue
+            leading = [list(index.columns)[0] for index in table.indexes if len(index.columns) > 0]
+            leading += list(table.primary_key.columns)[:1]
+            if any(lead is table.c[base_col.name] for lead in leading):
+                indexed.add(col.description)
+    return indexed
+
+
+def get_page_boundaries(
     _session: Session,
-    stmt_no_pag_dt: Select,
-    stmt_pag: Select,
-    rolling_total_column: str,
-    orderby_cols: list,
-) -> float:
-    stmt_pag_ordered = stmt_pag.order_by(*orderby_cols)
-    first_pag = _session.execute(stmt_pag_ordered).first()
-    if not first_pag:
-        return 0
-
-    stmt_no_pag_dt_ordered = stmt_no_pag_dt.order_by(*orderby_cols)
-    for col in orderby_cols:
-        stmt_no_pag_dt_ordered = stmt_no_pag_dt_ordered.where(
-            col < getattr(first_pag, col.name)
+    stmt_no_pag: Select,
+    keyset_cols: list,
+    limit: int,
+    stride: int = KEYSET_INDEX_STRIDE,
+    descending: bool = False,
+):
+    """Clé de la première ligne des pages 1, 1 + stride, 1 + 2 * stride, ...
+
+    Calculé en une requête (row_number) et gardé en cache jusqu'à la prochaine écriture.
+    """
+    cache_key = get_cache_key(
+        stmt_no_pag, _session.get_bind(), tuple(col.name for col in keyset_cols), limit, stride, descending
+    )
+
+    def compute():
+        sub = stmt_no_pag.subquery()
+        cols = [sub.c[col.name] for col in keyset_cols]
+        row_number = func.row_number().over(order_by=get_orderby(cols, descending)).label("stsql_row_number")
+        numbered = select(*cols, row_number).subquery()
+        stmt = (
+            select(*(numbered.c[col.name] for col in keyset_cols))
+            .where((numbered.c.stsql_row_number - 1) % (limit * stride) == 0)
+            .order_by(numbered.c.stsql_row_number)
         )
+        return [tuple(row) for row in _session.execute(stmt)]
+
+    return page_boundaries_cache.get_or_set(cache_key, compute)
 
-    stmt_bal = select(func.sum(stmt_no_pag_dt_ordered.c.get(rolling_total_column)))
-    bal = _session.execute(stmt_bal).scalar_one() or 0
-    return bal
+
+def get_keyset_seek(
+    _session: Session,
+    stmt_no_pag: Select,
+    keyset_cols: list,
+    limit: int,
+    page: int,
+    cursor: tuple[int, int, tuple] | None = None,
+    descending: bool = False,
+):
+    """Point de départ de la page : (clé, clé incluse, décalage)
+
+    La page suivante part du curseur (dernière ligne affichée) ; les autres partent de la borne
+    la plus proche dans l'index des pages, avec un décalage d'au plus KEYSET_INDEX_STRIDE pages.
+    """
+    if page == 1:
+        return None, False, 0
+
+    if cursor is not None:
+        cursor_page, cursor_limit, after = cursor
+        if cursor_page == page - 1 and cursor_limit == limit and None not in after:
+            return after, False, 0
+
+    boundaries = get_page_boundaries(_session, stmt_no_pag, keyset_cols, limit, descending=descending)
+    index, remainder = divmod(page - 1, KEYSET_INDEX_STRIDE)
+    if index >= len(boundaries) or None in boundaries[index]:
+        return None, False, (page - 1) * limit
+
+    return boundaries[index], True, remainder * limit
+
+
+def apply_keyset_seek(
+    stmt_no_pag: Select,
+    keyset_cols: list,
+    limit: int,
+    seek: tuple[tuple | None, bool, int],
+    descending: bool = False,
+):
+    bound, inclusive, offset = seek
+    stmt = stmt_no_pag.order_by(*get_orderby(keyset_cols, descending)).limit(limit)
+    if bound is not None:
+        key, bound = tuple_(*keyset_cols), tuple_(*bound)
+        if descending:
+            stmt = stmt.where(key <= bound if inclusive else key < bound)
+        else:
+            stmt = stmt.where(key >= bound if inclusive else key > bound)
+    if offset:
+        stmt = stmt.offset(offset)
+    return stmt
+
+
+def get_stmt_pag_keyset(
+    _session: Session,
+    stmt_no_pag: Select,
+    keyset_cols: list,
+    limit: int,
+    page: int,
+    cursor: tuple[int, int, tuple] | None = None,
+    descending: bool = False,
+):
+    """Comme get_stmt_pag, mais cherche la page par sa clé au lieu de sauter (page - 1) * limit lignes"""
+    seek = get_keyset_seek(_session, stmt_no_pag, keyset_cols, limit, page, cursor, descending)
+    return apply_keyset_seek(stmt_no_pag, keyset_cols, limit, seek, descending)
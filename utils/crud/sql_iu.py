@@ -1,19 +1,25 @@
 from collections.abc import Callable
+from typing import Literal
 
 import pandas as pd
 import streamlit as st
 from sqlalchemy import CTE, Select, select
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, Session
 from sqlalchemy.types import Enum as SQLEnum
 from streamlit import session_state as ss
 from streamlit.connections import SQLConnection
 from streamlit.elements.arrow import DataframeState
 
 from database.base import Base
-from utils.crud import create_delete_model, lib, read_cte, update_model
+from database.search import FullTextSearch
+from modules.db import DB
+from utils.crud import create_delete_model, lib, params, read_cte, update_model
+from utils.cache import TTLCache
 from utils.crud.ie import render_import_export_interface, DynamicImportExport
 
 OPTS_ITEMS_PAGE = (50, 100, 200, 500, 1000)
+# Colonne calculée, épinglée en tête du tableau, qui affiche le marqueur de row_style_fn
+ROW_MARKER_COLUMN = "stsql_row_marker"
 
 
 class SqlUi:
@@ -47,6 +53,11 @@ class SqlUi:
 			delete_callback: Callable = None,
 			enable_import_export: bool = False,
 			process_imported_dataframe: Callable = None,
+			pagination_mode: Literal["offset", "keyset"] = "offset",
+			approximate_count: bool = False,
+			balance_checkpoint_every: int | None = None,
+			row_style_fn: Callable[[pd.DataFrame], pd.Series] | None = None,
+			fk_search_limit: int | None = None,
 	):
 		"""The CRUD interface will be displayes just by initializing the class
 
@@ -57,12 +68,17 @@ class SqlUi:
 			available_filter (list[str], optional): Define wich columns the user will be able to filter in the top expander. Defaults to all
 			rolling_total_column (str, optional): A numeric column name of the read_instance. A new column will be displayed with the rolling sum of these column
 			rolling_orderby_colsname (list[str], optional): A list of columns name of the read_instance. It should contain a group of columns that ensures uniqueness of the rows and the order to calculate rolling sum. Usually, it should a date and id column. If not informed, rows will be sorted by id only. Defaults to None
-			df_style_formatter (dict[str,str]): a dictionary where each key is a column name and the associated value is the formatter arg of df.style.format method. See pandas docs for details.
+			df_style_formatter (dict[str,str]): a dictionary where each key is a column name and the associated value is the formatter arg of df.style.format method. See pandas docs for details. Number ("{:.2f}", "{:,.2f}") and date ("{:%d/%m/%Y}") formats are rendered with st.column_config, the others fall back to pandas Styler
 			read_use_container_width (bool, optional): add use_container_width to st.dataframe args. Default to False
 			hide_id (bool, optional): The id column will not be displayed if set to True. Defaults to True
 			base_key (str, optional): A prefix to add to widget's key argument. This is needed when creating more than one instance of this class in the same page. Defaults to empty str
-			style_fn (Callable[[pd.Series], list[str]], optional): A function that goes into the *func* argument of *df.style.apply*. The apply method also receives *axis=1*, so it works on rows. It can be used to apply conditional css formatting on each column of the row. See Styler.apply info on pandas docs. Defaults to None
+			style_fn (Callable[[pd.Series], list[str]], optional): A function that goes into the *func* argument of *df.style.apply*. The apply method also receives *axis=1*, so it works on rows. It can be used to apply conditional css formatting on each column of the row. See Styler.apply info on pandas docs. Prefer row_style_fn, which is vectorized. Defaults to None
+			row_style_fn (Callable[[pd.DataFrame], pd.Series], optional): A vectorized alternative to style_fn that does not go through pandas Styler. It receives the whole page and returns one short marker per row (e.g. np.where(df.amount > 0, "🟢", "🔴")), shown in a pinned leading column configured with st.column_config. Defaults to None
 			show_many (bool, optional): Show a st.expander of one-to-many relations in edit or create dialog
+			pagination_mode (str, optional): "offset" skips (page - 1) * limit rows. "keyset" seeks the page on rolling_orderby_colsname (plus id), keeping the cursor in the query params and a sparse cached index of page boundaries to jump to any page. Ordering columns should not be NULL in keyset mode. Defaults to "offset"
+			approximate_count (bool, optional): For very large tables. When the exact count is not cached yet, the pager shows the last known count right away while the exact count runs in the background, then the page reruns. Defaults to False
+			balance_checkpoint_every (int, optional): For very long ledgers with rolling_total_column in keyset mode. The running balance is cached every N rows, so a page only sums the rows since the nearest checkpoint instead of the whole prefix. Defaults to None
+			fk_search_limit (int, optional): For large reference tables. Foreign key inputs of the create and update dialogs get a search box and only list the first N labels starting with the typed text, plus the current value, instead of every row of the referenced table. Defaults to None
 			disable_log (bool): Every change in the database (READ, UPDATE, DELETE) is logged to stderr by default. If this is *true*, nothing is logged. To customize the logging format and where it logs to, use loguru as add a new sink to logger. See loguru docs for more information. Dafaults to False
 
 		Attributes:
@@ -129,6 +145,7 @@ class SqlUi:
 		self.hide_id = hide_id
 		self.base_key = base_key
 		self.style_fn = style_fn
+		self.row_style_fn = row_style_fn
 		self.show_many = show_many
 		self.disable_log = disable_log
 		self.create_callback = create_callback
@@ -136,8 +153,14 @@ class SqlUi:
 		self.delete_callback = delete_callback
 		self.enable_import_export = enable_import_export
 		self.process_imported_dataframe = process_imported_dataframe
+		self.pagination_mode = pagination_mode
+		self.approximate_count = approximate_count
+		self.balance_checkpoint_every = balance_checkpoint_every
+		self.fk_search_limit = fk_search_limit
 
 		self.cte = self.get_cte()
+		# Les lectures partent du select d'origine quand c'est possible, le CTE ne sert qu'aux métadonnées
+		self.source = read_cte.get_read_source(self.read_instance, self.cte)
 		self.rolling_pretty_name = lib.get_pretty_name(self.rolling_total_column or "")
 
 		if self.enable_import_export:
@@ -160,19 +183,24 @@ class SqlUi:
 
 		# Create UI
 		col_filter = self.filter()
-		stmt_no_pag = read_cte.get_stmt_no_pag(self.cte, col_filter)
-		qtty_rows = read_cte.get_qtty_rows(self.conn, stmt_no_pag)
-		items_per_page, page = self.pagination(qtty_rows, col_filter)
-		stmt_pag = read_cte.get_stmt_pag(stmt_no_pag, items_per_page, page)
-		initial_balance = self.get_initial_balance(
-			self.cte,
-			stmt_pag,
-			col_filter.no_dt_filters,
-			rolling_total_column,
-			self.rolling_orderby_colsname,
-		)
-		df = self.get_df(stmt_pag, initial_balance)
+		self.fulltext_search = self.search(col_filter)
+		self.sort_colname, self.sort_descending = self.sort()
+		self.saldo_toogle = self.show_saldo_toggle()
+		stmt_no_pag = read_cte.get_stmt_no_pag(self.source, col_filter)
+		items_per_page, page = self.get_pagination_state(col_filter)
+		df, qtty_rows, initial_balance = self.read_page(stmt_no_pag, col_filter, items_per_page, page)
+		if df.empty and page > 1 and qtty_rows > 0:
+			# La page demandée n'existe plus (suppressions, changement de taille) : retour à la première
+			page = 1
+			read_cte.set_pagination_page(page, self.base_key)
+			df, qtty_rows, initial_balance = self.read_page(stmt_no_pag, col_filter, items_per_page, page)
+		self.show_initial_balance(initial_balance)
+		self.pagination(qtty_rows)
+		self.set_cursor(df, items_per_page, page)
 		selection_state = self.show_df(df)
+		self.prefetch(stmt_no_pag, col_filter, df, qtty_rows, items_per_page, page)
+		# Les curseurs sont calculés : la pertinence de la recherche ne sort pas de SqlUi
+		df = df.drop(columns=read_cte.RANK_COLUMN, errors="ignore")
 		rows_selected = self.get_rows_selected(selection_state)
 
 		# CRUD
@@ -184,12 +212,87 @@ class SqlUi:
 		self.rows_selected = rows_selected
 		self.qtty_rows = qtty_rows
 
+	def read_page(self, stmt_no_pag: Select, col_filter: read_cte.ColFilter, items_per_page: int, page: int):
+		self.keyset_cols = read_cte.get_keyset_cols(stmt_no_pag, self.orderby_colsname)
+
+		key = self.page_key(stmt_no_pag, items_per_page, page)
+		df = read_cte.get_prefetched_page(ss.stsql_page_cache, key)
+		if df is None:
+			cursor = params.get_cursor_param(self.cursor_key, self.keyset_cols)
+			df = ss.stsql_page_cache.set(key, self.fetch_page(stmt_no_pag, col_filter, items_per_page, page, cursor))
+		return self.get_df(stmt_no_pag, df)
+
+	def page_key(self, stmt_no_pag: Select, items_per_page: int, page: int):
+		options = (
+			self.pagination_mode,
+			self.sort_colname,
+			self.sort_descending,
+			self.rolling_total_column is not None and self.saldo_toogle,
+			self.balance_checkpoint_every,
+		)
+		return read_cte.get_page_key(
+			DB.read_engine(self.conn), stmt_no_pag, options, items_per_page, page
+		)
+
+	def fetch_page(
+			self,
+			stmt_no_pag: Select,
+			col_filter: read_cte.ColFilter,
+			items_per_page: int,
+			page: int,
+			cursor: tuple[int, int, tuple] | None,
+	):
+		"""Lit la page telle que retournée par SQL (total et solde compris)
+
+		N'utilise pas l'état Streamlit : appelée aussi depuis les threads de lecture anticipée.
+		"""
+		with self.read_session() as s:
+			stmt_pag = self.get_stmt_pag(s, stmt_no_pag, col_filter, items_per_page, page, cursor)
+			if self.pagination_mode != "keyset":
+				stmt_pag = read_cte.with_total(stmt_pag)
+			return pd.read_sql(stmt_pag, s.connection())
+
+	def prefetch(
+			self,
+			stmt_no_pag: Select,
+			col_filter: read_cte.ColFilter,
+			df: pd.DataFrame,
+			qtty_rows: int,
+			items_per_page: int,
+			page: int,
+	):
+		"""Lit d'avance les pages suivante et précédente pour le prochain clic"""
+		last_page = -(-qtty_rows // items_per_page)
+		cache = ss.stsql_page_cache
+		for neighbour in (page + 1, page - 1):
+			if not 1 <= neighbour <= last_page:
+				continue
+			cursor = None
+			if neighbour == page + 1 and self.pagination_mode == "keyset" and not df.empty:
+				# Même conversion que le curseur de l'URL : des scalaires Python, pas numpy
+				after = tuple(
+					params.decode_key_value(params.encode_key_value(df.iloc[-1][col.name]), col.type.python_type)
+					for col in self.keyset_cols
+				)
+				cursor = (page, items_per_page, after)
+			key = self.page_key(stmt_no_pag, items_per_page, neighbour)
+			read_cte.prefetch_page(
+				cache, key,
+				lambda neighbour=neighbour, cursor=cursor: self.fetch_page(
+					stmt_no_pag, col_filter, items_per_page, neighbour, cursor
+				),
+			)
+
+	def read_session(self):
+		return DB.read_session(self.conn)
+
 	def set_initial_state(self):
 		lib.set_state("stsql_updated", 1)
 		lib.set_state("stsql_update_ok", None)
 		lib.set_state("stsql_update_message", None)
 		lib.set_state("stsql_opened", False)
 		lib.set_state("stsql_filters", {})
+		lib.set_state("stsql_page_cache", TTLCache(maxsize=read_cte.PREFETCH_CACHE_SIZE, ttl=600))
 
 	def set_structure(self):
 		self.header_container = st.container()
@@ -199,12 +302,19 @@ class SqlUi:
 		table_name = lib.get_pretty_name(self.edit_create_model.__crud_tablename__)
 		self.header_container.header(table_name, divider="orange")
 
-		self.expander_container = self.header_container.expander(
+		self.search_container = self.header_container.container()
+
+		# Les valeurs proposées par les filtres ne sont chargées que si le panneau est ouvert
+		filter_opened = self.header_container.toggle(
 			"Filtre",
-			icon=":material/search:",
+			key=f"{self.base_key}_filter_toggle_sql_ui",
+		)
+		self.expander_container = (
+			self.header_container.container(border=True) if filter_opened else None
 		)
 
 		self.filter_container = self.header_container.container()
+		self.sort_container = self.header_container.container()
 
 		if self.rolling_total_column:
 			self.saldo_toggle_col, self.saldo_value_col = self.header_container.columns(
@@ -231,13 +341,6 @@ class SqlUi:
 		else:
 			cte = select(self.read_instance).cte()
 
-		if self.rolling_total_column:
-			orderby_cols = [
-				cte.columns.get(colname) for colname in self.rolling_orderby_colsname
-			]
-			orderby_cols = [col for col in orderby_cols if col is not None]
-			cte = select(cte).order_by(*orderby_cols).cte()
-
 		return cte
 
 	def filter(self):
@@ -247,13 +350,14 @@ class SqlUi:
 				col.description for col in self.cte.columns if col.description
 			]
 
-		with self.conn.session as s:
-			existing = read_cte.get_existing_values(
-				_session=s,
-				cte=self.cte,
-				updated=ss.stsql_updated,
-				available_col_filter=filter_colsname,
-			)
+		existing = {}
+		if self.expander_container is not None:
+			with self.read_session() as s:
+				existing = read_cte.get_existing_values(
+					_session=s,
+					cte=self.cte,
+					available_col_filter=filter_colsname,
+				)
 
 		col_filter = read_cte.ColFilter(
 			self.expander_container,
@@ -267,87 +371,238 @@ class SqlUi:
 
 		return col_filter
 
-	def pagination(self, qtty_rows: int, col_filter: read_cte.ColFilter):
+	def search(self, col_filter: read_cte.ColFilter):
+		"""Recherche plein texte sur les colonnes __searchable__ du modèle (et __searchable_through__), classée par pertinence"""
+		if not FullTextSearch.is_searchable(self.edit_create_model):
+			return None
+
+		key = f"{self.base_key}_fulltext_sql_ui"
+		value = self.search_container.text_input(
+			"Rechercher",
+			value=params.get_fulltext_param(self.base_key) or "",
+			placeholder="Rechercher...",
+			icon=":material/search:",
+			label_visibility="collapsed",
+			key=key,
+			args=(self.base_key, key),
+			on_change=params.set_fulltext_param,
+		)
+		if not FullTextSearch.get_words(value):
+			return None
+
+		col_filter.fulltext = FullTextSearch.get_ranked(DB.read_engine(self.conn), self.edit_create_model, value)
+		return value
+
+	def get_qtty_rows(self, stmt_no_pag: Select):
+		if not self.approximate_count:
+			with self.read_session() as s:
+				return read_cte.get_qtty_rows(s, stmt_no_pag)
+
+		engine = DB.read_engine(self.conn)
+		qtty_rows, exact = read_cte.get_qtty_rows_approx(engine, stmt_no_pag)
+		if not exact:
+			self.pag_container.caption(f"≈ {qtty_rows:,} lignes, comptage en cours...")
+
+			@st.fragment(run_every=1)
+			def refine_count():
+				if read_cte.is_count_ready(engine, stmt_no_pag):
+					st.rerun()
+
+			with self.pag_container:
+				refine_count()
+
+		return qtty_rows
+
+	def sort(self):
+		"""Tri côté serveur : ORDER BY dans la requête, départagé par id, conservé dans l'URL"""
+		if self.rolling_total_column:
+			# Le solde cumulé suit l'ordre de rolling_orderby_colsname
+			return None, False
+
+		colsname = [col.description for col in self.cte.columns if col.description]
+		indexed = read_cte.get_indexed_colsnames(self.cte)
+		colname, descending = params.get_sort_param(self.base_key)
+		if colname not in colsname:
+			colname = None
+
+		# Les colonnes indexées d'abord : leur tri reste rapide sur une grande table
+		options = [None, *sorted(colsname, key=lambda c: c not in indexed)]
+		sort_col, dir_col = self.sort_container.columns([0.8, 0.2], vertical_alignment="bottom")
+		key = f"{self.base_key}_sort_sql_ui"
+		sort_col.selectbox(
+			"Trier par",
+			options=options,
+			index=options.index(colname),
+			format_func=lambda c: "Ordre par défaut" if c is None else f"{c} ⚡" if c in indexed else c,
+			help="⚡ : colonne indexée",
+			key=key,
+			args=(self.base_key, key),
+			on_change=params.set_sort_param,
+		)
+		dir_key = f"{self.base_key}_sort_dir_sql_ui"
+		dir_col.toggle(
+			"Décroissant",
+			value=descending,
+			key=dir_key,
+			args=(self.base_key, dir_key),
+			on_change=params.set_sort_dir_param,
+		)
+
+		return colname, descending
+
+	def get_pagination_state(self, col_filter: read_cte.ColFilter):
+		items_per_page, page = read_cte.get_pagination_state(OPTS_ITEMS_PAGE, self.base_key)
+
+		filters = {
+			**col_filter.no_dt_filters,
+			**col_filter.dt_filters,
+			**{f"{k}_search": v for k, v in col_filter.search_filters.items()},
+		}
+		filters["stsql_sort"] = (self.sort_colname, self.sort_descending)
+		filters["stsql_fulltext"] = self.fulltext_search
+		filters = {k: v for k, v in filters.items() if v not in (None, "", [], (None, None), (None, False))}
+		if filters != ss.stsql_filters:
+			page = 1
+			read_cte.set_pagination_page(page, self.base_key)
+			ss.stsql_filters = filters
+
+		return items_per_page, page
+
+	def pagination(self, qtty_rows: int):
 		with self.pag_container:
-			items_per_page, page = read_cte.show_pagination(
+			read_cte.show_pagination(
 				qtty_rows,
 				OPTS_ITEMS_PAGE,
 				self.base_key,
 			)
 
-		filters = {**col_filter.no_dt_filters, **col_filter.dt_filters}
-		if filters != ss.stsql_filters:
-			page = 1
-			ss.stsql_filters = filters
+	@property
+	def orderby_colsname(self):
+		"""Ordre des lignes : tri choisi, sinon pertinence de la recherche, sinon rolling_orderby_colsname"""
+		if self.sort_colname:
+			return [self.sort_colname]
+		if self.fulltext_search and self.rolling_total_column is None:
+			return [read_cte.RANK_COLUMN, *self.rolling_orderby_colsname]
+		return self.rolling_orderby_colsname
 
-		return items_per_page, page
+	@property
+	def cursor_key(self):
+		return f"{self.base_key}_cursor"
 
-	def get_initial_balance(
+	def get_stmt_pag(
 			self,
-			base_cte: CTE,
-			stmt_pag: Select,
-			no_dt_filters: dict,
-			rolling_total_column: str | None,
-			rolling_orderby_colsname: list[str],
+			s: Session,
+			stmt_no_pag: Select,
+			col_filter: read_cte.ColFilter,
+			items_per_page: int,
+			page: int,
+			cursor: tuple[int, int, tuple] | None,
 	):
-		if rolling_total_column is None:
-			return 0
+		orderby_colsname = self.orderby_colsname
+		keyset_cols = read_cte.get_keyset_cols(stmt_no_pag, orderby_colsname)
+		with_balance = self.rolling_total_column is not None and self.saldo_toogle
+
+		if self.pagination_mode != "keyset":
+			stmt = stmt_no_pag
+			if with_balance:
+				stmt = read_cte.get_stmt_balance(self.source, col_filter, self.rolling_total_column, orderby_colsname)
+			orderby = read_cte.get_orderby(read_cte.get_keyset_cols(stmt, orderby_colsname), self.sort_descending)
+			return read_cte.get_stmt_pag(stmt.order_by(*orderby), items_per_page, page)
+
+		seek = read_cte.get_keyset_seek(
+			s, stmt_no_pag, keyset_cols, items_per_page, page, cursor, self.sort_descending
+		)
+		stmt = stmt_no_pag
+		if with_balance:
+			checkpoint = None
+			if self.balance_checkpoint_every:
+				stmt_no_pag_dt = read_cte.get_stmt_no_pag_dt(
+					self.source, col_filter.no_dt_filters, col_filter.search_filters, col_filter.fulltext
+				)
+				checkpoint = read_cte.get_balance_checkpoint(
+					s, stmt_no_pag_dt, keyset_cols, self.rolling_total_column,
+					self.balance_checkpoint_every, seek,
+				)
+			stmt = read_cte.get_stmt_balance(
+				self.source, col_filter, self.rolling_total_column, orderby_colsname, checkpoint
+			)
+
+		keyset_cols = read_cte.get_keyset_cols(stmt, orderby_colsname)
+		return read_cte.apply_keyset_seek(stmt, keyset_cols, items_per_page, seek, self.sort_descending)
 
-		saldo_toogle = self.saldo_toggle_col.toggle(
+	def set_cursor(self, df: pd.DataFrame, items_per_page: int, page: int):
+		"""Retient la clé de la dernière ligne affichée pour chercher directement la page suivante"""
+		if self.pagination_mode != "keyset" or df.empty:
+			return
+		last_row = df.iloc[-1]
+		after = tuple(last_row[col.name] for col in self.keyset_cols)
+		params.set_cursor_param(self.cursor_key, page, items_per_page, after)
+
+	def show_saldo_toggle(self):
+		if self.rolling_total_column is None:
+			return False
+
+		return self.saldo_toggle_col.toggle(
 			f"Ajouter le solde précédent à {self.rolling_pretty_name}",
 			value=True,
 			key=f"{self.base_key}_saldo_toggle_sql_ui",
 		)
 
-		if not saldo_toogle:
-			return 0
-
-		stmt_no_pag_dt = read_cte.get_stmt_no_pag_dt(base_cte, no_dt_filters)
-
-		orderby_cols = [
-			base_cte.columns.get(colname) for colname in rolling_orderby_colsname
-		]
-		orderby_cols = [col for col in orderby_cols if col is not None]
-		with self.conn.session as s:
-			initial_balance = read_cte.initial_balance(
-				_session=s,
-				stmt_no_pag_dt=stmt_no_pag_dt,
-				stmt_pag=stmt_pag,
-				rolling_total_column=rolling_total_column,
-				orderby_cols=orderby_cols,
-			)
+	def show_initial_balance(self, initial_balance: float):
+		if self.rolling_total_column is None or not self.saldo_toogle:
+			return
 
 		self.saldo_value_col.subheader(
 			f"Solde précédent {self.rolling_pretty_name}: {initial_balance:,.2f}"
 		)
 
-		return initial_balance
-
 	def convert_arrow(self, df: pd.DataFrame):
 		cols = self.cte.columns
 		for col in cols:
-			if isinstance(col.type, SQLEnum):
-				col_name = col.name
-				df[col_name] = df[col_name].map(lambda v: v if isinstance(v, str) else v.value)
+			enum_class = getattr(col.type, "enum_class", None)
+			if isinstance(col.type, SQLEnum) and enum_class is not None and col.name in df.columns:
+				# Les Enum sans enum_class sont déjà lus comme str
+				mapping = {member: member.value for member in enum_class}
+				df[col.name] = df[col.name].map(mapping).fillna(df[col.name])
 
 		return df
 
 	def get_df(
 			self,
-			stmt_pag: Select,
-			initial_balance: float,
+			stmt_no_pag: Select,
+			df: pd.DataFrame,
 	):
-		with self.conn.connect() as c:
-			df = pd.read_sql(stmt_pag, c)
+		"""Prépare la page lue par fetch_page et en tire le nombre total de lignes filtrées
+
+		Hors mode keyset, le total vient de la même requête que la page ; en mode keyset, le prédicat de
+		recherche précède la fenêtre : le total vient alors du comptage en cache.
+		Retourne aussi le solde précédant la première ligne de la page.
+		"""
+		if read_cte.TOTAL_COLUMN in df.columns and not df.empty:
+			qtty_rows = int(df[read_cte.TOTAL_COLUMN].iloc[0])
+			read_cte.set_qtty_rows(DB.read_engine(self.conn), stmt_no_pag, qtty_rows)
+		else:
+			qtty_rows = self.get_qtty_rows(stmt_no_pag)
+		# Copie : la page lue reste intacte dans le cache des pages
+		df = df.drop(columns=read_cte.TOTAL_COLUMN, errors="ignore")
 
 		df = self.convert_arrow(df)
 		if self.rolling_total_column is None:
-			return df
+			return df, qtty_rows, 0
 
 		rolling_col_name = f"Solde {self.rolling_pretty_name}"
-		df[rolling_col_name] = df[self.rolling_total_column].cumsum() + initial_balance
+		if read_cte.BALANCE_COLUMN not in df.columns:
+			df[rolling_col_name] = df[self.rolling_total_column].cumsum()
+			return df, qtty_rows, 0
 
-		return df
+		balance = df.pop(read_cte.BALANCE_COLUMN)
+		df[rolling_col_name] = balance
+		initial_balance = 0
+		if not df.empty:
+			first_amount = df[self.rolling_total_column].iloc[0]
+			initial_balance = balance.iloc[0] - (0 if pd.isna(first_amount) else first_amount)
+
+		return df, qtty_rows, initial_balance
 
 	def add_balance_formatter(self, df_style_formatter: dict[str, str]):
 		formatter = {}
@@ -359,27 +614,47 @@ class SqlUi:
 
 		return formatter
 
+	def style_df(self, df: pd.DataFrame, styler_formatter: dict[str, str]):
+		"""Passe par pandas Styler seulement si un format sans équivalent ou style_fn l'exige"""
+		if not styler_formatter and self.style_fn is None:
+			return df
+
+		df_style = df.style
+		if styler_formatter:
+			df_style = df_style.format(styler_formatter)  # pyright: ignore
+		if self.style_fn is not None:
+			df_style = df_style.apply(self.style_fn, axis=1)
+
+		return df_style
+
 	def show_df(self, df: pd.DataFrame):
 		if df.empty:
 			st.header(":red[Aucune donnée]")
 			return None
 
+		# La pertinence de la recherche reste dans df pour le curseur, sans être affichée
+		hidden = {"id", read_cte.RANK_COLUMN} if self.hide_id else {read_cte.RANK_COLUMN}
 		column_order = None
-		if self.hide_id:
-			column_order = [colname for colname in df.columns if colname != "id"]
+		if hidden & set(df.columns):
+			column_order = [colname for colname in df.columns if colname not in hidden]
 
-		df_style = df.style
 		formatter = self.add_balance_formatter(self.df_style_formatter)
-		df_style = df_style.format(formatter)  # pyright: ignore
-		if self.style_fn is not None:
-			df_style = df_style.apply(self.style_fn, axis=1)
+		column_config, styler_formatter = lib.get_column_config(formatter, df)
+		if self.row_style_fn is not None:
+			# Marqueur calculé en une fois pour la page, rendu par column_config et non par Styler
+			markers = pd.Series(self.row_style_fn(df), index=df.index).fillna("")
+			df = df.assign(**{ROW_MARKER_COLUMN: markers})
+			column_order = [ROW_MARKER_COLUMN, *(colname for colname in column_order or df.columns if colname != ROW_MARKER_COLUMN)]
+			column_config[ROW_MARKER_COLUMN] = st.column_config.TextColumn("", width="small", pinned=True)
+		data = self.style_df(df, styler_formatter)
 
 		selection_state = self.data_container.dataframe(
-			df_style,
+			data,
 			use_container_width=self.read_use_container_width,
 			height=650,
 			hide_index=True,
 			column_order=column_order,
+			column_config=column_config,
 			on_select="rerun",
 			selection_mode="multi-row",
 			key=f"{self.base_key}_df_sql_ui",
@@ -411,7 +686,8 @@ class SqlUi:
 				Model=self.edit_create_model,
 				default_values=self.edit_create_default_values,
 				create_show_many=self.show_many,
-				callback=self.create_callback
+				callback=self.create_callback,
+				fk_search_limit=self.fk_search_limit,
 			)
 			create_row.show_dialog()
 		elif action == "edit":
@@ -423,7 +699,8 @@ class SqlUi:
 				row_id=row_id,
 				default_values=self.edit_create_default_values,
 				update_show_many=self.show_many,
-				callback=self.update_callback
+				callback=self.update_callback,
+				fk_search_limit=self.fk_search_limit,
 			)
 			update_row.show_dialog()
 		elif action == "delete":
@@ -451,6 +728,8 @@ def show_sql_ui(
 		base_key: str = "",
 		style_fn: Callable[[pd.Series], list[str]] | None = None,
 		update_show_many: bool = False,
+		pagination_mode: Literal["offset", "keyset"] = "offset",
+		fk_search_limit: int | None = None,
 ) -> tuple[pd.DataFrame, list[int]] | None:
 	"""Show A CRUD interface in a Streamlit Page
 
@@ -477,6 +756,8 @@ def show_sql_ui(
 		base_key=base_key,
 		style_fn=style_fn,
 		show_many=update_show_many,
+		pagination_mode=pagination_mode,
+		fk_search_limit=fk_search_limit,
 	)
 
 	return ui.df, ui.rows_selected
@@ -7,6 +7,7 @@ from streamlit import session_state as ss
 from streamlit.connections.sql_connection import SQLConnection
 from streamlit.delta_generator import DeltaGenerator
 
+from utils.cache import Generations
 from utils.crud import many
 from utils.crud.filters import ExistingData
 from utils.crud.input_fields import InputFields
@@ -22,6 +23,7 @@ class UpdateRow:
 			default_values: dict | None = None,
 			update_show_many: bool = False,
 			callback: Callable | None = None,
+			fk_search_limit: int | None = None,
 	) -> None:
 		self.conn = conn
 		self.Model = Model
@@ -34,7 +36,7 @@ class UpdateRow:
 
 		with conn.session as s:
 			self.row = s.get_one(Model, row_id)
-			self.existing_data = ExistingData(s, Model, self.default_values, self.row)
+			self.existing_data = ExistingData(s, Model, self.default_values, self.row, fk_search_limit, conn)
 
 		self.input_fields = InputFields(
 			Model, "update", self.default_values, self.existing_data
@@ -71,6 +73,7 @@ class UpdateRow:
 
 				s.add(row)
 				s.commit()
+				Generations.bump(self.Model.__tablename__)
 				self.callback(row) if self.callback else None
 				log("UPDATE", self.Model.__tablename__, row)
 				return True, f"{row} a été mis à jour avec succès"
@@ -83,6 +86,7 @@ class UpdateRow:
 	def show(self):
 		pretty_name = get_pretty_name(self.Model.__crud_tablename__)
 		st.subheader(pretty_name)
+		self.input_fields.input_fk_searches()
 		with st.form(f"update_model_form_{pretty_name}", border=False):
 			updated = self.get_updates()
 			update_btn = st.form_submit_button("Enregistrer", type="primary")